@@ -8,6 +8,7 @@ from django.http.request import HttpRequest
 from django.urls import reverse
 from django.utils.html import format_html, urlencode
 from . import models
+from .blocklist import block_users, unblock_users
 
 # Register your models here.
 
@@ -129,7 +130,7 @@ class GenreAdmin(admin.ModelAdmin):
 
     ordering = ['title']
 
-    @admin.display(ordering='movies_count')
+    @admin.display(ordering='movie_count')
     def movies_count(self, genre):
         #Code to dynamically render and store the url of the html link.
         # We would also need to pass in a special argument (admin: app_model_page).
@@ -144,10 +145,7 @@ class GenreAdmin(admin.ModelAdmin):
             }))
         #Code to include a html link to the movies admin page 
         # from the genres page.
-        return format_html('<a href="{}">{}</a>', url, genre.movies_count)
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(movies_count=Count('movie'))
+        return format_html('<a href="{}">{}</a>', url, genre.movie_count)
 
 
 class RentOrderItemInline(admin.TabularInline):
@@ -167,11 +165,14 @@ class RentOrderAdmin(admin.ModelAdmin):
     ordering = ['rent_date']
     list_filter = ['rent_date', 'return_date', OrderStatusFilter]
     list_select_related = ['customer']
+    #Set by the order.returned event handler, editing it would restock the order twice.
+    readonly_fields = ['restocked']
 
 #Class to include fields within the rentorder child relationship 
 # in the CustomerAdmin form, which is its parent.
 class RentOrderInline(admin.TabularInline):
     model = models.RentOrder
+    readonly_fields = ['restocked']
 
     #removes extra fields
     extra = 0
@@ -183,7 +184,7 @@ class AddressInline(admin.TabularInline):
 
 @admin.register(models.Customer)
 class CustomerAdmin(admin.ModelAdmin):
-    actions = ['block_user']
+    actions = ['block_user', 'unblock_user']
     inlines = [RentOrderInline, AddressInline]
     list_display = ['first_name', 'last_name']
     list_per_page = 10
@@ -196,16 +197,24 @@ class CustomerAdmin(admin.ModelAdmin):
     #customer model and use either the MinValueValidator and the MaxValueValidator 
     #to implement it. 
 
-    #Function to enable the blocking of a user by updating the permissions 
-    # in the default queryset.
+    #Function to block the users of the selected customers through the blocklist, which
+    # BlockUserPermission checks on every request.
     @admin.action(description='Block user')
     def block_user(self, request, queryset: QuerySet):
-        queryset.update(is_active=False)
+        block_users(queryset.values_list('user_id', flat=True))
         self.message_user(
             request,
             "User was successfully blocked."
         )
 
+    @admin.action(description='Unblock user')
+    def unblock_user(self, request, queryset: QuerySet):
+        unblock_users(queryset.values_list('user_id', flat=True))
+        self.message_user(
+            request,
+            "User was successfully unblocked."
+        )
+
 
 
 @admin.register(models.Review)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class HubConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hub'
+
+    #Registering the signal handlers and the outbox event handlers once the models are loaded.
+    def ready(self):
+        from . import events, signals
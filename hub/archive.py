@@ -0,0 +1,122 @@
+from datetime import timedelta
+from functools import cmp_to_key
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import ArchivedRentOrder, ArchivedRentOrderItem, RentOrder, RentOrderItem
+
+
+#Moving old, finished orders into the archive tables a batch at a time, and reading the order
+# history across both. An order is archived once it has been returned and paid and was rented
+# more than ARCHIVE_AFTER_DAYS ago; until then it stays in RentOrder.
+
+ORDER_FIELDS = ['id', 'order_status', 'rent_date', 'return_date', 'payment_status', 'customer_id', 'idempotency_key']
+ITEM_FIELDS = ['id', 'rent_order_id', 'movie_id', 'quantity', 'unit_price', 'late_fee']
+
+#The hot and the archived models, in the order history reads go through them.
+ORDER_MODELS = [(RentOrder, RentOrderItem), (ArchivedRentOrder, ArchivedRentOrderItem)]
+
+
+def archivable_orders(before=None):
+    if before is None:
+        before = timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    return RentOrder.objects.filter(
+        order_status=RentOrder.ORDER_STATUS_RETURNED,
+        payment_status=RentOrder.PAYMENT_STATUS_COMPLETE,
+        rent_date__lt=before,
+    )
+
+
+#Moves one batch and returns the number of orders moved, 0 once there is nothing left to do.
+#The rows are removed with _raw_delete so that no delete signals are sent: the orders are still
+# part of the customer's history (CustomerSummary) and of the revenue, they just live elsewhere.
+def archive_batch(before=None, batch_size=None):
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    with transaction.atomic():
+        order_ids = list(archivable_orders(before)
+                         .select_for_update(skip_locked=True)
+                         .order_by('id')
+                         .values_list('id', flat=True)[:batch_size])
+        if not order_ids:
+            return 0
+
+        orders = RentOrder.objects.filter(pk__in=order_ids)
+        items = RentOrderItem.objects.filter(rent_order_id__in=order_ids)
+        ArchivedRentOrder.objects.bulk_create([ArchivedRentOrder(**row) for row in orders.values(*ORDER_FIELDS)])
+        ArchivedRentOrderItem.objects.bulk_create([ArchivedRentOrderItem(**row) for row in items.values(*ITEM_FIELDS)])
+        items._raw_delete(items.db)
+        orders._raw_delete(orders.db)
+    return len(order_ids)
+
+
+#The orders of the hot and the archive tables read as one queryset, for the order listings.
+#filter(), order_by(), only()... are applied to the queryset of each table. Slicing reads the
+# slice from both tables and merges the rows in the order_by() ordering, so a keyset paginated
+# page (pagination.py) costs a query per table however deep it is. prefetch_related() also takes
+# functions of the item model, for Prefetch objects that have to name the item model:
+#   OrderHistory().filter(customer_id=1).prefetch_related(lambda item_model: Prefetch('items', ...))
+class OrderHistory:
+    model = RentOrder
+
+    def __init__(self, querysets=None):
+        self.querysets = querysets or [order_model.objects.all() for order_model, item_model in ORDER_MODELS]
+
+    def chain(self, method, *args, **kwargs):
+        return OrderHistory([getattr(queryset, method)(*args, **kwargs) for queryset in self.querysets])
+
+    def all(self):
+        return self.chain('all')
+
+    def filter(self, *args, **kwargs):
+        return self.chain('filter', *args, **kwargs)
+
+    def order_by(self, *fields):
+        return self.chain('order_by', *fields)
+
+    def only(self, *fields):
+        return self.chain('only', *fields)
+
+    def prefetch_related(self, *lookups):
+        return OrderHistory([queryset.prefetch_related(*[lookup(item_model) if callable(lookup) else lookup for lookup in lookups])
+                             for queryset, (order_model, item_model) in zip(self.querysets, ORDER_MODELS)])
+
+    def first(self):
+        return next(iter(self[:1]), None)
+
+    #The rows of both tables in the ordering of the querysets, with None sorting first as on
+    # SQLite and MySQL.
+    def merge(self, querysets):
+        ordering = [(field.lstrip('-'), field.startswith('-')) for field in self.querysets[0].query.order_by]
+
+        def compare(a, b):
+            for name, descending in ordering:
+                (x, y) = (getattr(a, name), getattr(b, name))
+                if x != y:
+                    less = y is not None and (x is None or x < y)
+                    return (-1 if less else 1) * (-1 if descending else 1)
+            return 0
+        return sorted([row for queryset in querysets for row in queryset], key=cmp_to_key(compare))
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('OrderHistory only supports slices without a step.')
+        #The rows before key.stop in the merged order are among the first key.stop of each table.
+        querysets = self.querysets if key.stop is None else [queryset[:key.stop] for queryset in self.querysets]
+        return self.merge(querysets)[key]
+
+    def __iter__(self):
+        return iter(self.merge(self.querysets))
+
+
+#Runs the same grouped aggregate on the hot and the archived models and adds the results up,
+# since a union can't be aggregated. Returns {key: {field: total}}, key being the value of the
+# key column, or a tuple of values when key is a tuple of columns.
+def order_history_totals(build, key, fields):
+    totals = {}
+    for order_model, item_model in ORDER_MODELS:
+        for row in build(order_model, item_model):
+            row_key = tuple(row[column] for column in key) if isinstance(key, tuple) else row[key]
+            entry = totals.setdefault(row_key, dict.fromkeys(fields, 0))
+            for field in fields:
+                entry[field] += row[field] or 0
+    return totals
@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+import barcode
+from barcode.writer import ImageWriter
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+#Barcodes are derived from the movie id, so the same movie always gets the same code, and the
+# image is stored under a name derived from the code. Rendering is skipped whenever that file
+# already exists, so a code is never rendered twice.
+
+BARCODE_DIRECTORY = 'images/barcodes'
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+
+
+def barcode_code(movie_id):
+    #The 12 digits an EAN-13 is built from, the 13th being the checksum added by python-barcode.
+    # Numeric ids are used as they are, under the 200 in-store prefix, anything else is hashed.
+    movie_id = str(movie_id)
+    if movie_id.isdigit():
+        return f'200{int(movie_id):09d}'
+    digest = int(hashlib.sha1(movie_id.encode()).hexdigest(), 16)
+    return f'2{digest % 10**11:011d}'
+
+
+def barcode_path(code):
+    return f'{BARCODE_DIRECTORY}/{code}.png'
+
+
+def render_barcode(code):
+    #Kept free of any django state so that it can run in a separate process.
+    EAN = barcode.get_barcode_class('ean13')
+    buffer = BytesIO()
+    EAN(code, writer=ImageWriter()).write(buffer)
+    return buffer.getvalue()
+
+
+def store_barcode(code, image=None):
+    path = barcode_path(code)
+    if default_storage.exists(path):
+        return path
+    if image is None:
+        image = render_barcode(code)
+    default_storage.save(path, ContentFile(image))
+    return path
+
+
+def _store_in_background(code):
+    try:
+        store_barcode(code)
+    finally:
+        with _executor_lock:
+            _in_flight.discard(code)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BARCODE_WORKERS, thread_name_prefix='barcode')
+        return _executor
+
+
+#Queues the image for rendering on the worker pool, so saving a movie never waits for it.
+def schedule_barcode(code):
+    with _executor_lock:
+        if code in _in_flight:
+            return
+        _in_flight.add(code)
+    get_executor().submit(_store_in_background, code)
+
+
+#Used by the backfill_barcodes and import_catalog commands. Images are rendered across a process
+# pool while this process writes them to storage.
+def render_missing_barcodes(codes, workers=None):
+    missing_codes = sorted(code for code in set(codes) if not default_storage.exists(barcode_path(code)))
+    if not missing_codes:
+        return 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        images = executor.map(render_barcode, missing_codes, chunksize=64)
+        for code, image in zip(missing_codes, images):
+            store_barcode(code, image)
+    return len(missing_codes)
@@ -0,0 +1,82 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import BlockedUser
+
+
+#The blocked users, checked by BlockUserPermission on every request. Each process keeps the ids
+# in a set, so a check is a set lookup. Blocking or unblocking bumps a version number kept in the
+# shared cache, and a process compares its copy's version with it at most every
+# BLOCKLIST_CHECK_SECONDS, reloading the ids from BlockedUser only when it changed. A copy is
+# also reloaded after BLOCKLIST_MAX_AGE seconds in any case, in case the cache lost the version.
+
+BLOCKLIST_VERSION_KEY = 'blocklist:version'
+
+_snapshot = {'version': None, 'user_ids': frozenset(), 'checked_at': 0.0, 'loaded_at': 0.0}
+_lock = threading.Lock()
+
+
+def get_version():
+    version = cache.get(BLOCKLIST_VERSION_KEY)
+    if version is None:
+        cache.add(BLOCKLIST_VERSION_KEY, 1, timeout=None)
+        version = cache.get(BLOCKLIST_VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(BLOCKLIST_VERSION_KEY)
+    except ValueError:
+        #The key was missing, a fresh version makes every process reload.
+        cache.set(BLOCKLIST_VERSION_KEY, int(time.time()), timeout=None)
+
+
+def load_snapshot(now):
+    global _snapshot
+    with _lock:
+        #Another thread may have reloaded the snapshot while this one waited for the lock.
+        if _snapshot['checked_at'] > now - settings.BLOCKLIST_CHECK_SECONDS:
+            return _snapshot
+        version = get_version()
+        snapshot = dict(_snapshot, checked_at=now)
+        if version != _snapshot['version'] or now - _snapshot['loaded_at'] >= settings.BLOCKLIST_MAX_AGE:
+            snapshot.update(
+                version=version,
+                user_ids=frozenset(BlockedUser.objects.values_list('user_id', flat=True)),
+                loaded_at=now,
+            )
+        _snapshot = snapshot
+        return snapshot
+
+
+def get_blocked_user_ids():
+    now = time.monotonic()
+    snapshot = _snapshot
+    if now - snapshot['checked_at'] >= settings.BLOCKLIST_CHECK_SECONDS:
+        snapshot = load_snapshot(now)
+    return snapshot['user_ids']
+
+
+def is_blocked(user_id):
+    return user_id in get_blocked_user_ids()
+
+
+def invalidate():
+    global _snapshot
+    bump_version()
+    #This process sees the change on its next check rather than up to BLOCKLIST_CHECK_SECONDS later.
+    _snapshot = dict(_snapshot, checked_at=0.0)
+
+
+def block_users(user_ids):
+    user_ids = list(user_ids)
+    BlockedUser.objects.bulk_create([BlockedUser(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+    transaction.on_commit(invalidate)
+
+
+def unblock_users(user_ids):
+    BlockedUser.objects.filter(user_id__in=list(user_ids)).delete()
+    transaction.on_commit(invalidate)
@@ -0,0 +1,145 @@
+import hashlib
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+from .models import Movie
+
+
+#Response cache and conditional GET support for the catalog endpoints (movies and genres).
+#The whole catalog shares a single version number. Every change to a movie or genre bumps it
+# (see signals.py), which makes every cached response and every ETag handed out before the change
+# stale at once, without having to find and delete the individual keys.
+#Stock is the exception: it changes with every checkout, so reserving and releasing copies
+# doesn't bump the version. The inventory in a cached response is instead replaced with the
+# values kept per movie under the stock keys, which checkouts only clear for their own movies.
+
+CATALOG_STATE_KEY = 'catalog:state'
+STOCK_MODIFIED_KEY = 'catalog:stock_modified'
+
+
+#A lock shared by everything using the same cache, taken with add() (SET NX on Redis). Waits at
+# most timeout seconds: by then the holder has let go or its lock has expired. With wait=False,
+# yields False instead of waiting when the lock is taken.
+@contextmanager
+def cache_lock(key, timeout=10, wait=True, using=cache):
+    token = uuid.uuid4().hex
+    while not using.add(key, token, timeout=timeout):
+        if not wait:
+            yield False
+            return
+        time.sleep(0.01)
+    try:
+        yield True
+    finally:
+        if using.get(key) == token:
+            using.delete(key)
+
+
+def get_catalog_state():
+    state = cache.get(CATALOG_STATE_KEY)
+    if state is None:
+        #Cold cache, the only time a catalog read has to ask the database when it last changed.
+        last_modified = Movie.objects.aggregate(last_modified=Max('last_updated'))['last_modified']
+        state = {'version': 1, 'last_modified': last_modified or timezone.now()}
+        cache.add(CATALOG_STATE_KEY, state, timeout=None)
+    return state
+
+
+#last_modified never goes backwards, or clients holding a newer Last-Modified would get a 304
+# for a catalog that changed since.
+def bump_catalog_version(last_modified=None):
+    state = get_catalog_state()
+    cache.set(CATALOG_STATE_KEY, {
+        'version': state['version'] + 1,
+        'last_modified': max(last_modified or timezone.now(), state['last_modified']),
+    }, timeout=None)
+
+
+#Stock keys are namespaced by the catalog version, so that a bump also drops them.
+def stock_key(version, movie_id):
+    return f'catalog:{version}:stock:{movie_id}'
+
+
+def get_stock(version, movie_ids):
+    keys = {stock_key(version, movie_id): movie_id for movie_id in movie_ids}
+    stock = {keys[key]: inventory for key, inventory in cache.get_many(list(keys)).items()}
+    missing = [movie_id for movie_id in movie_ids if movie_id not in stock]
+    if missing:
+        loaded = dict(Movie.objects.filter(pk__in=missing).order_by().values_list('pk', 'inventory'))
+        cache.set_many({stock_key(version, movie_id): inventory for movie_id, inventory in loaded.items()},
+                       timeout=settings.CATALOG_STOCK_TIMEOUT)
+        stock.update(loaded)
+    return stock
+
+
+#Called once the change to the movies' inventory is committed.
+def forget_stock(movie_ids):
+    version = get_catalog_state()['version']
+    cache.delete_many([stock_key(version, movie_id) for movie_id in movie_ids])
+    cache.set(STOCK_MODIFIED_KEY, timezone.now(), timeout=None)
+
+
+class CatalogCacheMixin:
+    #Query parameters that select on the stock. Those results can change with any checkout, so
+    # they are never cached.
+    stock_params = []
+
+    #The rows of the response data that show an inventory, replaced with the current stock.
+    def stock_rows(self, data):
+        return []
+
+    #Overriding list and retrieve keeps the permission checks in initial() in front of the cache.
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if any(param in request.query_params for param in self.stock_params):
+            return handler(request, *args, **kwargs)
+
+        state = get_catalog_state()
+        key = f'catalog:{state["version"]}:{request.accepted_renderer.format}:{request.get_full_path()}'
+        data = cache.get(key)
+        fresh = data is None
+        if fresh:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+        etag = f'{state["version"]}-{request.accepted_renderer.format}'
+        last_modified = state['last_modified']
+        rows = self.stock_rows(data)
+        if rows:
+            if fresh:
+                #Just read from the database, so the rows already show the current stock.
+                cache.set_many({stock_key(state['version'], row['id']): row['inventory'] for row in rows},
+                               timeout=settings.CATALOG_STOCK_TIMEOUT)
+            else:
+                stock = get_stock(state['version'], [row['id'] for row in rows])
+                for row in rows:
+                    row['inventory'] = stock.get(row['id'], row['inventory'])
+            #The stock shown is part of the representation, so it is part of the validators too.
+            etag += '-' + hashlib.md5(repr([(row['id'], row['inventory']) for row in rows]).encode()).hexdigest()[:12]
+            last_modified = max(last_modified, cache.get(STOCK_MODIFIED_KEY) or last_modified)
+        etag = f'"{etag}"'
+
+        #The client already has the current representation: 304 without touching the database.
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
@@ -0,0 +1,363 @@
+import time
+import uuid
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import IntegrityError, connection, transaction
+from decimal import Decimal
+from django.db.models import DecimalField, ExpressionWrapper, F, Max, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.utils.module_loading import import_string
+from .caching import cache_lock
+from .models import Cart, CartItem, Movie
+from .pricing import line_totals
+
+
+#Storage backends for carts. CartViewSet, CartItemViewSet and the cart serializers only talk to
+# the store returned by get_cart_store(), which is picked with the CART_STORE setting:
+#
+#   DatabaseCartStore keeps carts in the Cart and CartItem tables, one write per change.
+#   CacheCartStore keeps the items of live carts in the 'carts' cache and writes them to the
+#    CartItem table in batches once the cart has been idle for CART_IDLE_TIMEOUT seconds (see the
+#    flush_carts command). At checkout the items are read straight from the cache.
+#
+#DatabaseCartStore is the default. The cache store is only safe on a cache that every process
+# shares and that never drops entries on its own, since a dropped entry is a lost cart: it refuses
+# to start on anything but Redis (with maxmemory-policy noeviction), or on the local memory cache
+# when CART_CACHE_SINGLE_PROCESS says a single process serves every cart (tests, runserver).
+#
+#Both return Cart and CartItem instances with their movies and a total_price attached, so the
+# serializers and the API look the same whichever store is used. The database store computes the
+# totals in SQL, the cache store with pricing.py.
+
+
+def get_cart_store():
+    return import_string(settings.CART_STORE)()
+
+
+class UnknownMovie(Exception):
+    def __init__(self, movie_ids):
+        self.movie_ids = sorted(movie_ids)
+        super().__init__(f'No movie with the id {", ".join(self.movie_ids)} exists.')
+
+
+def merge_lines(lines):
+    #lines are (movie_id, quantity) pairs, the same movie may appear more than once.
+    quantities = {}
+    for movie_id, quantity in lines:
+        quantities[movie_id] = quantities.get(movie_id, 0) + quantity
+    return quantities
+
+
+#Cart ids come from the URL. A malformed one is a cart that doesn't exist, not a server error.
+def parse_cart_id(cart_id):
+    try:
+        return uuid.UUID(str(cart_id))
+    except ValueError:
+        raise Http404
+
+
+def attach_items(cart: Cart, items):
+    #Filling the prefetch cache, so cart.items.all() returns the items without a query.
+    queryset = CartItem.objects.filter(cart_id=cart.pk)
+    queryset._result_cache = list(items)
+    queryset._prefetch_done = True
+    cart._prefetched_objects_cache = {'items': queryset}
+    cart.total_price = sum((item.total_price for item in items), Decimal('0.00'))
+    return cart
+
+
+def attach_movies(items):
+    movies = Movie.objects.only('id', 'title', 'daily_rental_rate').in_bulk({item.movie_id for item in items})
+    for item in items:
+        item.movie = movies[item.movie_id]
+    totals = line_totals([(item.quantity, item.movie.daily_rental_rate) for item in items])
+    for item, total in zip(items, totals):
+        item.total_price = total
+    return items
+
+
+TOTAL_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+#Cart items with their movie trimmed to the columns SimpleMovieSerializer shows, and the line
+# total computed by the database.
+def cart_items_queryset():
+    return (CartItem.objects
+            .select_related('movie')
+            .only('id', 'cart_id', 'quantity', 'movie__id', 'movie__title', 'movie__daily_rental_rate')
+            .annotate(total_price=ExpressionWrapper(F('quantity') * F('movie__daily_rental_rate'), output_field=TOTAL_FIELD)))
+
+
+class DatabaseCartStore:
+    def create_cart(self):
+        return attach_items(Cart.objects.create(), [])
+
+    def get_cart(self, cart_id):
+        cart_total = Coalesce(Sum(F('items__quantity') * F('items__movie__daily_rental_rate'), output_field=TOTAL_FIELD),
+                              Value(Decimal('0.00')), output_field=TOTAL_FIELD)
+        try:
+            return (Cart.objects
+                    .annotate(total_price=cart_total)
+                    .prefetch_related(Prefetch('items', queryset=cart_items_queryset()))
+                    .get(pk=cart_id))
+        except (Cart.DoesNotExist, ValidationError, ValueError):
+            raise Http404
+
+    def delete_cart(self, cart_id):
+        deleted, _ = Cart.objects.filter(pk=parse_cart_id(cart_id)).delete()
+        if not deleted:
+            raise Http404
+
+    def list_items(self, cart_id):
+        return list(cart_items_queryset().filter(cart_id=parse_cart_id(cart_id)))
+
+    def get_item(self, cart_id, item_id):
+        try:
+            return cart_items_queryset().get(cart_id=cart_id, pk=item_id)
+        except (CartItem.DoesNotExist, ValidationError, ValueError):
+            raise Http404
+
+    def add_item(self, cart_id, movie_id, quantity):
+        return self.add_items(cart_id, [(movie_id, quantity)])[0]
+
+    #Adds the movies to the cart with a single INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE
+    # that increments the quantity of the items already in the cart, so there is no read first
+    # and concurrent adds of the same movie can't trip over unique_together.
+    #Unknown movies and carts are reported by the foreign keys instead of being checked beforehand.
+    def add_items(self, cart_id, lines):
+        cart_id = parse_cart_id(cart_id)
+        quantities = merge_lines(lines)
+        table = connection.ops.quote_name(CartItem._meta.db_table)
+        cart_value = CartItem._meta.get_field('cart').get_db_prep_save(cart_id, connection)
+        params = []
+        for movie_id, quantity in quantities.items():
+            params += [cart_value, movie_id, quantity]
+        insert = (f'INSERT INTO {table} (cart_id, movie_id, quantity) VALUES '
+                  + ', '.join(['(%s, %s, %s)'] * len(quantities)))
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    if connection.vendor == 'mysql':
+                        cursor.execute(insert + ' ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)', params)
+                        cursor.execute(f'SELECT id, movie_id, quantity FROM {table} WHERE cart_id = %s AND movie_id IN ('
+                                       + ', '.join(['%s'] * len(quantities)) + ')', [cart_value, *quantities])
+                    else:
+                        cursor.execute(insert + f' ON CONFLICT (cart_id, movie_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity'
+                                       ' RETURNING id, movie_id, quantity', params)
+                    rows = cursor.fetchall()
+        except IntegrityError:
+            #Only on the failure path: finding out whether the cart or a movie is missing.
+            if not Cart.objects.filter(pk=cart_id).exists():
+                raise Http404
+            known = Movie.objects.filter(pk__in=list(quantities)).values_list('pk', flat=True)
+            raise UnknownMovie(set(quantities) - set(known))
+
+        items = {movie_id: CartItem(id=item_id, cart_id=cart_id, movie_id=movie_id, quantity=quantity)
+                 for item_id, movie_id, quantity in rows}
+        return [items[movie_id] for movie_id in quantities]
+
+    def update_item(self, cart_id, item_id, quantity):
+        cart_item = self.get_item(cart_id, item_id)
+        cart_item.quantity = quantity
+        cart_item.save()
+        return cart_item
+
+    def remove_item(self, cart_id, item_id):
+        try:
+            deleted, _ = CartItem.objects.filter(cart_id=cart_id, pk=item_id).delete()
+        except (ValidationError, ValueError):
+            raise Http404
+        if not deleted:
+            raise Http404
+
+    #(movie_id, quantity, daily_rental_rate) of every item, for the checkout. One query.
+    def get_checkout_lines(self, cart_id):
+        return list(CartItem.objects.filter(cart_id=cart_id).values_list('movie_id', 'quantity', 'movie__daily_rental_rate'))
+
+    #Nothing to write back, the tables are always up to date.
+    def flush_idle(self, batch_size=500):
+        return 0
+
+
+#Cart entries in the cache look like:
+#   {'created_at': datetime, 'touched_at': timestamp, 'dirty': bool,
+#    'items': [{'id': 1, 'movie_id': '00001', 'quantity': 2}, ...]}
+#The Cart row itself is created in the database straight away, with cached=True while its items
+# live in the cache, which is how flush_idle finds the carts it has to look at.
+#Every read-modify-write of an entry, including the write-back in flush_idle, runs under a lock
+# on the cart (caching.cache_lock), so two requests on the same cart are applied
+# one after the other instead of one overwriting the other.
+#Item ids come from an INCR on a counter in the cache, atomic on Redis, so that they stay the same
+# when the items are written to the table. The counter is seeded once, with add(), from the
+# largest CartItem id; as the cache never evicts it, it is not seeded again while ids it handed
+# out are still live. The DatabaseCartStore doesn't use the counter, so after running on it for a
+# while the counter has to be deleted before switching back.
+class CacheCartStore:
+    ITEM_ID_KEY = 'cart:item_id'
+    #Seconds after which the lock of a process that died holding it expires.
+    LOCK_TIMEOUT = 10
+
+    def __init__(self):
+        self.cache = caches[settings.CART_CACHE]
+        if not (isinstance(self.cache, RedisCache)
+                or (isinstance(self.cache, LocMemCache) and settings.CART_CACHE_SINGLE_PROCESS)):
+            raise ImproperlyConfigured(
+                f'CacheCartStore needs a Redis cache that does not evict entries as CACHES[{settings.CART_CACHE!r}], '
+                f'or the local memory cache with CART_CACHE_SINGLE_PROCESS = True. Use DatabaseCartStore otherwise.')
+
+    def key(self, cart_id):
+        return f'cart:{cart_id}'
+
+    def lock(self, cart_id, wait=True):
+        return cache_lock(f'{self.key(cart_id)}:lock', timeout=self.LOCK_TIMEOUT, wait=wait, using=self.cache)
+
+    def next_item_id(self):
+        if self.cache.get(self.ITEM_ID_KEY) is None:
+            largest = CartItem.objects.aggregate(largest=Max('id'))['largest'] or 0
+            self.cache.add(self.ITEM_ID_KEY, largest, timeout=None)
+        return self.cache.incr(self.ITEM_ID_KEY)
+
+    def save_entry(self, cart_id, entry, dirty=True):
+        entry['touched_at'] = time.time()
+        entry['dirty'] = entry.get('dirty', False) or dirty
+        self.cache.set(self.key(cart_id), entry, timeout=None)
+
+    #Callers that change the entry hold the lock on the cart.
+    def load_entry(self, cart_id):
+        entry = self.cache.get(self.key(cart_id))
+        if entry is not None:
+            return entry
+        #Not live (flushed after being idle, cache restarted...): load it from the tables.
+        try:
+            cart = Cart.objects.prefetch_related('items').get(pk=cart_id)
+        except (Cart.DoesNotExist, ValidationError, ValueError):
+            raise Http404
+        entry = {
+            'created_at': cart.created_at,
+            'items': [{'id': item.id, 'movie_id': item.movie_id, 'quantity': item.quantity} for item in cart.items.all()],
+        }
+        #add, so an entry another request put in the cache meanwhile isn't replaced by the tables.
+        entry.update(touched_at=time.time(), dirty=False)
+        if not self.cache.add(self.key(cart_id), entry, timeout=None):
+            return self.cache.get(self.key(cart_id)) or entry
+        if not cart.cached:
+            Cart.objects.filter(pk=cart_id).update(cached=True)
+        return entry
+
+    def build_item(self, cart_id, item):
+        return CartItem(id=item['id'], cart_id=cart_id, movie_id=item['movie_id'], quantity=item['quantity'])
+
+    def find_item(self, entry, item_id):
+        for item in entry['items']:
+            if str(item['id']) == str(item_id):
+                return item
+        raise Http404
+
+    def create_cart(self):
+        cart = Cart.objects.create(cached=True)
+        self.save_entry(cart.pk, {'created_at': cart.created_at, 'items': []}, dirty=False)
+        return attach_items(cart, [])
+
+    def get_cart(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        entry = self.load_entry(cart_id)
+        cart = Cart(id=cart_id, created_at=entry['created_at'], cached=True)
+        return attach_items(cart, self.list_items(cart_id, entry))
+
+    def delete_cart(self, cart_id):
+        cart_id = parse_cart_id(cart_id)
+        with self.lock(cart_id):
+            self.cache.delete(self.key(cart_id))
+            deleted, _ = Cart.objects.filter(pk=cart_id).delete()
+        if not deleted:
+            raise Http404
+
+    def list_items(self, cart_id, entry=None):
+        entry = entry or self.load_entry(parse_cart_id(cart_id))
+        return attach_movies([self.build_item(cart_id, item) for item in entry['items']])
+
+    def get_item(self, cart_id, item_id):
+        item = self.find_item(self.load_entry(parse_cart_id(cart_id)), item_id)
+        return attach_movies([self.build_item(cart_id, item)])[0]
+
+    def add_item(self, cart_id, movie_id, quantity):
+        return self.add_items(cart_id, [(movie_id, quantity)])[0]
+
+    def add_items(self, cart_id, lines):
+        cart_id = parse_cart_id(cart_id)
+        quantities = merge_lines(lines)
+        known = Movie.objects.filter(pk__in=list(quantities)).values_list('pk', flat=True)
+        unknown = set(quantities) - set(known)
+
+        with self.lock(cart_id):
+            entry = self.load_entry(cart_id)
+            if unknown:
+                raise UnknownMovie(unknown)
+            items = {item['movie_id']: item for item in entry['items']}
+            for movie_id, quantity in quantities.items():
+                if movie_id in items:
+                    items[movie_id]['quantity'] += quantity
+                else:
+                    items[movie_id] = {'id': self.next_item_id(), 'movie_id': movie_id, 'quantity': quantity}
+                    entry['items'].append(items[movie_id])
+            self.save_entry(cart_id, entry)
+        return [self.build_item(cart_id, items[movie_id]) for movie_id in quantities]
+
+    def update_item(self, cart_id, item_id, quantity):
+        cart_id = parse_cart_id(cart_id)
+        with self.lock(cart_id):
+            entry = self.load_entry(cart_id)
+            item = self.find_item(entry, item_id)
+            item['quantity'] = quantity
+            self.save_entry(cart_id, entry)
+        return attach_movies([self.build_item(cart_id, item)])[0]
+
+    def remove_item(self, cart_id, item_id):
+        cart_id = parse_cart_id(cart_id)
+        with self.lock(cart_id):
+            entry = self.load_entry(cart_id)
+            item = self.find_item(entry, item_id)
+            entry['items'].remove(item)
+            self.save_entry(cart_id, entry)
+
+    def write_carts(self, entries):
+        #One DELETE and one INSERT for the items of all the carts being written.
+        cart_ids = list(entries)
+        items = [self.build_item(cart_id, item) for cart_id, entry in entries.items() for item in entry['items']]
+        with transaction.atomic():
+            CartItem.objects.filter(cart_id__in=cart_ids).delete()
+            CartItem.objects.bulk_create(items)
+
+    def get_checkout_lines(self, cart_id):
+        items = self.load_entry(parse_cart_id(cart_id))['items']
+        rates = dict(Movie.objects.filter(pk__in=[item['movie_id'] for item in items]).values_list('pk', 'daily_rental_rate'))
+        return [(item['movie_id'], item['quantity'], rates[item['movie_id']]) for item in items]
+
+    #Writes the carts that haven't been touched for CART_IDLE_TIMEOUT seconds back to the
+    # tables in batches, and drops them from the cache. Carts locked by a request are being
+    # touched and are left for the next run.
+    def flush_idle(self, batch_size=500):
+        idle_since = time.time() - settings.CART_IDLE_TIMEOUT
+        cart_ids = list(Cart.objects.filter(cached=True).values_list('pk', flat=True))
+        flushed = 0
+        for start in range(0, len(cart_ids), batch_size):
+            with ExitStack() as stack:
+                locked = [cart_id for cart_id in cart_ids[start:start + batch_size]
+                          if stack.enter_context(self.lock(cart_id, wait=False))]
+                keys = {self.key(cart_id): cart_id for cart_id in locked}
+                entries = {keys[key]: entry for key, entry in self.cache.get_many(list(keys)).items()}
+                idle = {cart_id: entry for cart_id, entry in entries.items() if entry['touched_at'] < idle_since}
+                #Carts that were marked as cached but have no entry left have nothing to write.
+                done = [cart_id for cart_id in locked if cart_id not in entries] + list(idle)
+
+                self.write_carts({cart_id: entry for cart_id, entry in idle.items() if entry['dirty']})
+                Cart.objects.filter(pk__in=done).update(cached=False)
+                self.cache.delete_many([self.key(cart_id) for cart_id in idle])
+            flushed += len(idle)
+        return flushed
@@ -0,0 +1,19 @@
+from django.core.cache import cache
+from .models import Customer
+
+
+#Every order request needs the id of the customer of the logged in user. It never changes once
+# the customer exists, so it is cached per user instead of running get_or_create each time.
+#signals.py drops the entry when a customer is deleted.
+
+def customer_id_key(user_id):
+    return f'customer_id:{user_id}'
+
+
+def get_customer_id(user_id):
+    customer_id = cache.get(customer_id_key(user_id))
+    if customer_id is None:
+        (customer, created) = Customer.objects.only('id').get_or_create(user_id=user_id)
+        customer_id = customer.id
+        cache.set(customer_id_key(user_id), customer_id, timeout=None)
+    return customer_id
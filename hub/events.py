@@ -0,0 +1,29 @@
+from .history import adjust_summary
+from .inventory import release_inventory
+from .leaderboards import record_order
+from .models import RentOrder, RentOrderItem
+from .outbox import handles
+from .revenue import record_order_revenue
+
+
+#Work done for the order events published by signals.py, run by run_outbox_worker.
+
+@handles('order.created')
+def count_order_rentals(order_id):
+    record_order(order_id)
+
+
+#sign is 1 when the payment became Complete and -1 when it stopped being Complete.
+@handles('order.payment_changed')
+def record_order_payment(order_id, sign):
+    order = RentOrder.objects.only('id', 'customer_id', 'rent_date').get(pk=order_id)
+    totals = record_order_revenue(order, sign)
+    adjust_summary(order.customer_id, spent=sign * (totals['total_revenue'] or 0))
+
+
+#Only the first return puts the movies back: setting restocked in the same transaction keeps an
+# order returned again after being moved back to Collected from adding its copies twice.
+@handles('order.returned')
+def restock_returned_order(order_id):
+    if RentOrder.objects.filter(pk=order_id, restocked=False).update(restocked=True):
+        release_inventory(RentOrderItem.objects.filter(rent_order_id=order_id).values_list('movie_id', 'quantity'))
@@ -0,0 +1,93 @@
+import csv
+import json
+from itertools import chain
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .archive import ORDER_MODELS
+from .history import filter_date_range
+from .models import Movie
+
+
+#Full dumps of the orders and the catalog as CSV or newline delimited JSON. The rows are read
+# EXPORT_CHUNK_SIZE at a time with keyset queries (WHERE id > last id ORDER BY id LIMIT n, see
+# keyset_rows) and written out one line at a time, so memory use stays the same whatever the size
+# of the tables. iterator() can't be relied on for that, MySQL's driver reads the whole result
+# into memory. Used by the hub/exports/ endpoints (as a StreamingHttpResponse) and by the
+# export_data command.
+
+ORDER_COLUMNS = [
+    'rent_order_id', 'rent_order__rent_date', 'rent_order__customer_id', 'rent_order__order_status',
+    'rent_order__payment_status', 'id', 'movie_id', 'quantity', 'unit_price', 'late_fee',
+]
+ORDER_HEADERS = [
+    'order_id', 'rent_date', 'customer_id', 'order_status',
+    'payment_status', 'item_id', 'movie_id', 'quantity', 'unit_price', 'late_fee',
+]
+MOVIE_COLUMNS = ['id', 'title', 'description', 'daily_rental_rate', 'inventory', 'age_rating', 'last_updated']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+#Reads the values_list() rows of queryset in primary key order, a batch at a time. Each batch
+# starts after the last id of the previous one, so it costs an index seek however deep the
+# export is. key_index is the position of the primary key in the rows, chunk_size defaults to
+# EXPORT_CHUNK_SIZE.
+def keyset_rows(queryset, key_index, chunk_size=None):
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    last_id = None
+    while True:
+        batch = queryset if last_id is None else queryset.filter(pk__gt=last_id)
+        rows = list(batch.order_by('pk')[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][key_index]
+
+
+#One row per order item, with the order's columns repeated. Archived orders are included: the
+# archive table is read first and the hot table after it, each in item id order.
+def order_rows(start=None, end=None, order_status=None, payment_status=None):
+    def build(order_model, item_model):
+        items = filter_date_range(item_model.objects.all(), 'rent_order__rent_date', start, end)
+        if order_status:
+            items = items.filter(rent_order__order_status=order_status)
+        if payment_status:
+            items = items.filter(rent_order__payment_status=payment_status)
+        return items.values_list(*ORDER_COLUMNS)
+
+    rows = chain.from_iterable(keyset_rows(build(order_model, item_model), ORDER_COLUMNS.index('id'))
+                               for order_model, item_model in reversed(ORDER_MODELS))
+    return ORDER_HEADERS, rows
+
+
+#start and end select the movies last updated in that range, for partners pulling changes.
+def movie_rows(start=None, end=None):
+    movies = filter_date_range(Movie.objects.all(), 'last_updated', start, end)
+    return MOVIE_COLUMNS, keyset_rows(movies.values_list(*MOVIE_COLUMNS), MOVIE_COLUMNS.index('id'))
+
+
+#csv.writer only writes to files, this hands each formatted line straight back instead.
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_lines(output, headers, rows):
+    if output == 'ndjson':
+        return ndjson_lines(headers, rows)
+    return csv_lines(headers, rows)
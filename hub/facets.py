@@ -0,0 +1,60 @@
+from django.db.models import Count, Q
+from .models import Movie
+
+
+#Facet counts for the movie catalog: how many of the movies matching the current filters and
+# search fall in each genre, age rating and price bucket. The age rating and price counts come
+# from a single aggregate over the matching movies and the genre counts from one GROUP BY over
+# the genres table, whatever the number of facet values.
+
+#(label, lower bound inclusive, upper bound exclusive) of the daily_rental_rate buckets.
+PRICE_BUCKETS = [
+    ('under_2', None, 2),
+    ('2_to_4', 2, 4),
+    ('4_to_6', 4, 6),
+    ('6_and_over', 6, None),
+]
+
+
+def price_bucket_filter(lower, upper):
+    condition = Q()
+    if lower is not None:
+        condition &= Q(daily_rental_rate__gte=lower)
+    if upper is not None:
+        condition &= Q(daily_rental_rate__lt=upper)
+    return condition
+
+
+def get_movie_facets(queryset):
+    #Filtering on genres joins the genres table and can repeat a movie, so the facets are
+    # counted over the distinct ids of the filtered queryset.
+    movie_ids = queryset.order_by().values('pk')
+    movies = Movie.objects.filter(pk__in=movie_ids)
+
+    counts = {f'age_rating_{code}': Count('pk', filter=Q(age_rating=code)) for code, label in Movie.AGE_RATING_CHOICES}
+    counts.update({f'price_{label}': Count('pk', filter=price_bucket_filter(lower, upper))
+                   for label, lower, upper in PRICE_BUCKETS})
+    counts['total'] = Count('pk')
+    totals = movies.aggregate(**counts)
+
+    genres = (Movie.genres.through.objects
+              .filter(movie_id__in=movie_ids)
+              .values('genre_id', 'genre__title')
+              .annotate(count=Count('movie_id'))
+              .order_by('-count', 'genre__title'))
+
+    return {
+        'total': totals['total'],
+        'genres': [
+            {'id': genre['genre_id'], 'title': genre['genre__title'], 'count': genre['count']}
+            for genre in genres
+        ],
+        'age_rating': [
+            {'value': code, 'label': label, 'count': totals[f'age_rating_{code}']}
+            for code, label in Movie.AGE_RATING_CHOICES
+        ],
+        'daily_rental_rate': [
+            {'value': label, 'gte': lower, 'lt': upper, 'count': totals[f'price_{label}']}
+            for label, lower, upper in PRICE_BUCKETS
+        ],
+    }
@@ -0,0 +1,55 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+#Sparse fieldsets for the hub viewsets. Clients can ask for ?fields=id,title or ?exclude=genres
+# and the response only contains those fields. The queryset is narrowed to match: only the
+# columns the requested fields read are loaded, and relations are only prefetched when a field
+# that nests them was asked for.
+#
+#Views describe what each serializer field needs with:
+#   sparse_columns: field name -> model columns it reads
+#   sparse_prefetches: field name -> prefetch_related lookups it needs
+#   sparse_required_columns: columns that are always loaded (pk, pagination ordering...)
+class SparseFieldsMixin:
+    sparse_columns = {}
+    sparse_prefetches = {}
+    sparse_required_columns = ['id']
+
+    def get_sparse_fields(self, available_fields):
+        #Returns the names of the fields to keep, or None when the whole representation is wanted.
+        if self.request.method not in SAFE_METHODS:
+            return None
+        fields = self.request.query_params.get('fields')
+        exclude = self.request.query_params.get('exclude')
+        if fields:
+            requested = {name.strip() for name in fields.split(',')}
+            return [name for name in available_fields if name in requested]
+        if exclude:
+            excluded = {name.strip() for name in exclude.split(',')}
+            return [name for name in available_fields if name not in excluded]
+        return None
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        #With many=True the fields live on the child serializer.
+        target = getattr(serializer, 'child', serializer)
+        keep = self.get_sparse_fields(list(target.fields))
+        if keep is not None:
+            for name in list(target.fields):
+                if name not in keep:
+                    target.fields.pop(name)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        keep = self.get_sparse_fields(list(self.get_serializer_class()().fields))
+        if keep is None:
+            return queryset
+
+        columns = list(self.sparse_required_columns)
+        prefetches = []
+        for name in keep:
+            columns += self.sparse_columns.get(name, [])
+            prefetches += self.sparse_prefetches.get(name, [])
+        #Dropping the prefetches of the base queryset and only adding back the ones asked for.
+        return queryset.prefetch_related(None).prefetch_related(*prefetches).only(*dict.fromkeys(columns))
@@ -0,0 +1,22 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import Genre, Movie
+
+
+#Keeping Genre.movie_count in step with the genres table. The signals adjust the counts by the
+# number of links added or removed, refresh_movie_counts recounts genres after bulk writes that
+# don't send signals (import_catalog).
+
+def adjust_movie_counts(genre_ids, delta):
+    if genre_ids and delta:
+        Genre.objects.filter(pk__in=genre_ids).update(movie_count=F('movie_count') + delta)
+
+
+def refresh_movie_counts(genre_ids=None):
+    links = (Movie.genres.through.objects
+             .filter(genre_id=OuterRef('pk'))
+             .values('genre_id')
+             .annotate(count=Count('movie_id'))
+             .values('count'))
+    genres = Genre.objects.all() if genre_ids is None else Genre.objects.filter(pk__in=genre_ids)
+    genres.update(movie_count=Coalesce(Subquery(links), 0))
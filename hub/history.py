@@ -0,0 +1,67 @@
+from datetime import datetime, time, timedelta
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.utils import timezone
+from .archive import OrderHistory, order_history_totals
+from .models import CustomerSummary, RentOrder
+
+
+#A customer's order history and the running totals shown with it. The signals adjust the
+# CustomerSummary row as orders are created, returned and paid, refresh_customer_summaries
+# recounts it from the orders for existing data.
+
+def adjust_summary(customer_id, rentals=0, open_rentals=0, spent=0):
+    if not (rentals or open_rentals or spent):
+        return
+    CustomerSummary.objects.get_or_create(customer_id=customer_id)
+    CustomerSummary.objects.filter(customer_id=customer_id).update(
+        total_rentals=F('total_rentals') + rentals,
+        open_rentals=F('open_rentals') + open_rentals,
+        total_spent=F('total_spent') + spent,
+    )
+
+
+def get_summary(customer):
+    try:
+        return customer.summary
+    except CustomerSummary.DoesNotExist:
+        return CustomerSummary(customer=customer)
+
+
+#start and end are dates, turned into a range on the datetime field so that its index is used
+# rather than comparing the date of every row.
+def filter_date_range(queryset, field, start=None, end=None):
+    if start:
+        queryset = queryset.filter(**{f'{field}__gte': timezone.make_aware(datetime.combine(start, time.min))})
+    if end:
+        queryset = queryset.filter(**{f'{field}__lt': timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))})
+    return queryset
+
+
+#The orders of both the hot and the archive tables (archive.py), each served by its
+# (customer, rent_date) index.
+def get_history(customer_id, start=None, end=None):
+    return filter_date_range(OrderHistory().filter(customer_id=customer_id), 'rent_date', start, end)
+
+
+def refresh_customer_summaries():
+    decimal = DecimalField(max_digits=12, decimal_places=2)
+    orders = order_history_totals(
+        lambda order_model, item_model: (order_model.objects
+                                         .values('customer_id')
+                                         .annotate(rentals=Count('id'),
+                                                   open=Count('id', filter=Q(order_status=RentOrder.ORDER_STATUS_COLLECTED)))
+                                         .order_by()),
+        'customer_id', ['rentals', 'open'])
+    spent = order_history_totals(
+        lambda order_model, item_model: (item_model.objects
+                                         .filter(rent_order__payment_status=RentOrder.PAYMENT_STATUS_COMPLETE)
+                                         .values(customer_id=F('rent_order__customer_id'))
+                                         .annotate(spent=Sum(F('quantity') * F('unit_price'), output_field=decimal))
+                                         .order_by()),
+        'customer_id', ['spent'])
+    summaries = [CustomerSummary(customer_id=customer_id, total_rentals=row['rentals'], open_rentals=row['open'],
+                                 total_spent=spent.get(customer_id, {}).get('spent', 0))
+                 for customer_id, row in orders.items()]
+    CustomerSummary.objects.all().delete()
+    CustomerSummary.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from .caching import forget_stock
+from .models import Movie
+
+
+#Stock reservation for checkouts. All the movies of a checkout are decremented with a single
+# conditional UPDATE (inventory = inventory - n WHERE inventory >= n, with n picked per movie by a
+# CASE on the id), so two checkouts racing for the last copy can't both succeed and no
+# SELECT ... FOR UPDATE is needed to read the stock first. If fewer rows than movies were updated,
+# one of them ran out and the reservation is rolled back.
+#The UPDATE still holds the row lock until the checkout commits, so it should be the last
+# statement of the checkout transaction to keep hot titles from queueing behind each other.
+
+
+class InsufficientInventory(Exception):
+    def __init__(self, movie_id):
+        self.movie_id = movie_id
+        super().__init__(f'Movie {movie_id} is out of stock.')
+
+
+def group_quantities(lines):
+    #lines are (movie_id, quantity) pairs. Movies are locked in id order so that two checkouts
+    # sharing movies always take the row locks in the same order and can't deadlock.
+    quantities = {}
+    for movie_id, quantity in lines:
+        quantities[movie_id] = quantities.get(movie_id, 0) + quantity
+    return sorted(quantities.items())
+
+
+#The quantity of each movie, as an expression usable in the UPDATE.
+def quantity_case(quantities):
+    return Case(*[When(pk=movie_id, then=Value(quantity)) for movie_id, quantity in quantities],
+                output_field=IntegerField())
+
+
+def reserve_inventory(lines):
+    quantities = group_quantities(lines)
+    movie_ids = [movie_id for movie_id, quantity in quantities]
+    try:
+        with transaction.atomic():
+            updated = (Movie.objects
+                       .filter(pk__in=movie_ids, inventory__gte=quantity_case(quantities))
+                       .update(inventory=F('inventory') - quantity_case(quantities)))
+            if updated < len(quantities):
+                #Leaving the atomic block rolls back the movies that were reserved.
+                raise InsufficientInventory(None)
+            #update() doesn't send post_save, and the catalog responses show the inventory. Only the
+            # stock of these movies is refreshed, the cached catalog responses stay valid.
+            transaction.on_commit(lambda: forget_stock(movie_ids))
+    except InsufficientInventory:
+        #Only on the failure path: finding the movie that ran out, now that the stock is back.
+        stock = dict(Movie.objects.filter(pk__in=movie_ids).values_list('pk', 'inventory'))
+        short = [movie_id for movie_id, quantity in quantities if stock.get(movie_id, 0) < quantity]
+        raise InsufficientInventory(short[0] if short else movie_ids[0]) from None
+
+
+def release_inventory(lines):
+    quantities = group_quantities(lines)
+    with transaction.atomic():
+        Movie.objects.filter(pk__in=[movie_id for movie_id, quantity in quantities]).update(
+            inventory=F('inventory') + quantity_case(quantities))
+        transaction.on_commit(lambda: forget_stock([movie_id for movie_id, quantity in quantities]))
@@ -0,0 +1,115 @@
+from decimal import Decimal
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .exports import keyset_rows
+from .models import RentOrder, RentOrderItem
+
+
+#Late fees on rentals that haven't been returned yet (order status Collected). A movie is due
+# LATE_FEES['RENTAL_DAYS'] days after it was rented. Returning it within LATE_FEES['GRACE_DAYS']
+# days of the due date costs nothing, after that every day since the due date is charged
+# LATE_FEES['DAILY_PERCENT'] percent of the unit price per copy, capped at LATE_FEES['DAILY_CAP'].
+#
+#The fees of all the outstanding items are computed in chunks of NumPy arrays, in whole cents so
+# the arithmetic is exact, and the items whose fee changed are written back with bulk_update.
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def get_policy():
+    return {
+        'rental_days': settings.LATE_FEES['RENTAL_DAYS'],
+        'grace_days': settings.LATE_FEES['GRACE_DAYS'],
+        'daily_percent': settings.LATE_FEES['DAILY_PERCENT'],
+        'daily_cap_cents': int(Decimal(str(settings.LATE_FEES['DAILY_CAP'])) * 100),
+    }
+
+
+#rent_dates are POSIX timestamps, unit_prices in cents. Returns the days late and the fee in
+# cents of every item.
+def compute_late_fees(rent_dates, quantities, unit_prices, as_of, policy):
+    days_out = np.floor((as_of - rent_dates) / SECONDS_PER_DAY).astype(np.int64)
+    late_days = np.maximum(days_out - policy['rental_days'], 0)
+    late_days[late_days <= policy['grace_days']] = 0
+    daily_fee = np.minimum(unit_prices * policy['daily_percent'] // 100, policy['daily_cap_cents'])
+    return late_days, late_days * daily_fee * quantities
+
+
+def to_cents(amounts):
+    return np.array([int(amount * 100) for amount in amounts], dtype=np.int64)
+
+
+def from_cents(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def outstanding_items():
+    return RentOrderItem.objects.filter(rent_order__order_status=RentOrder.ORDER_STATUS_COLLECTED)
+
+
+#Recomputes the late fee of every outstanding item, reading them chunk_size at a time with
+# keyset queries (iterator() would read the whole result into memory on MySQL). Returns the number of items looked at and the number updated.
+def update_late_fees(chunk_size=5000, as_of=None):
+    as_of = (as_of or timezone.now()).timestamp()
+    policy = get_policy()
+    rows = keyset_rows(
+        outstanding_items().values_list('id', 'rent_order__rent_date', 'quantity', 'unit_price', 'late_fee'),
+        0,
+        chunk_size,
+    )
+
+    checked = updated = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            updated += write_chunk(chunk, as_of, policy)
+            checked += len(chunk)
+            chunk = []
+    if chunk:
+        updated += write_chunk(chunk, as_of, policy)
+        checked += len(chunk)
+    return checked, updated
+
+
+def write_chunk(chunk, as_of, policy):
+    ids, rent_dates, quantities, unit_prices, current_fees = zip(*chunk)
+    late_days, fees = compute_late_fees(
+        np.array([rent_date.timestamp() for rent_date in rent_dates]),
+        np.array(quantities, dtype=np.int64),
+        to_cents(unit_prices),
+        as_of,
+        policy,
+    )
+    changed = np.nonzero(fees != to_cents(current_fees))[0]
+    items = [RentOrderItem(id=ids[index], late_fee=from_cents(fees[index])) for index in changed]
+    with transaction.atomic():
+        RentOrderItem.objects.bulk_update(items, ['late_fee'], batch_size=1000)
+    return len(items)
+
+
+#What the order would owe in late fees if it were returned now, without saving anything.
+def preview_order_fees(order: RentOrder, as_of=None):
+    as_of = as_of or timezone.now()
+    items = list(order.items.all())
+    if order.order_status != RentOrder.ORDER_STATUS_COLLECTED or not items:
+        late_days, fees = np.zeros(len(items), dtype=np.int64), np.zeros(len(items), dtype=np.int64)
+    else:
+        late_days, fees = compute_late_fees(
+            np.full(len(items), order.rent_date.timestamp()),
+            np.array([item.quantity for item in items], dtype=np.int64),
+            to_cents([item.unit_price for item in items]),
+            as_of.timestamp(),
+            get_policy(),
+        )
+    return {
+        'order': order.id,
+        'as_of': as_of,
+        'items': [
+            {'id': item.id, 'late_days': int(days), 'late_fee': from_cents(fee)}
+            for item, days, fee in zip(items, late_days, fees)
+        ],
+        'total': from_cents(fees.sum()),
+    }
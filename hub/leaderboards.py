@@ -0,0 +1,115 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .caching import cache_lock
+from .models import Customer, LeaderboardCounter, Movie, RentOrder
+
+
+#Top movies and top customers. Every new order (the order.created event) adds to the daily
+# counters (LeaderboardCounter) and updates the top LEADERBOARD_SIZE entries of each window kept
+# in the cache, so reading a leaderboard only reads those few entries. The refresh_leaderboards command rebuilds the cached lists from
+# the counters periodically, which also drops the days that have left the week and month windows.
+#The outbox worker records orders from several threads or processes, so the cached lists are
+# updated once the counters are committed and under a lock per board: each update reads the list
+# and the totals after the previous one has written them, and none of them is lost.
+
+WINDOWS = {
+    'week': 7,
+    'month': 30,
+    'all': None,
+}
+
+
+def cache_key(board, window):
+    return f'leaderboard:{board}:{window}'
+
+
+def lock_key(board):
+    return f'leaderboard:{board}:lock'
+
+
+def window_counters(board, window):
+    counters = LeaderboardCounter.objects.filter(board=board)
+    days = WINDOWS[window]
+    if days is not None:
+        counters = counters.filter(date__gt=timezone.localdate() - timedelta(days=days))
+    return counters
+
+
+def get_labels(board, object_ids):
+    if board == LeaderboardCounter.BOARD_MOVIES:
+        return {movie.pk: movie.title for movie in Movie.objects.only('id', 'title').filter(pk__in=object_ids)}
+    customers = Customer.objects.select_related('user').only('id', 'user__first_name', 'user__last_name').filter(pk__in=object_ids)
+    return {str(customer.pk): str(customer) for customer in customers}
+
+
+#replace=False only fills in a missing list, without overwriting one an update wrote meanwhile.
+def refresh_leaderboard(board, window, replace=True):
+    top = list(window_counters(board, window)
+               .values('object_id')
+               .annotate(total=Sum('count'))
+               .order_by('-total', 'object_id')[:settings.LEADERBOARD_SIZE])
+    labels = get_labels(board, [row['object_id'] for row in top])
+    entries = [{'id': row['object_id'], 'label': labels.get(row['object_id'], ''), 'count': row['total']} for row in top]
+    if replace:
+        cache.set(cache_key(board, window), entries, timeout=None)
+    else:
+        cache.add(cache_key(board, window), entries, timeout=None)
+    return entries
+
+
+def refresh_leaderboards():
+    for board, label in LeaderboardCounter.BOARD_CHOICES:
+        with cache_lock(lock_key(board)):
+            for window in WINDOWS:
+                refresh_leaderboard(board, window)
+
+
+def get_leaderboard(board, window):
+    entries = cache.get(cache_key(board, window))
+    if entries is None:
+        entries = refresh_leaderboard(board, window, replace=False)
+    return entries
+
+
+def increment(board, counts, day):
+    for object_id, count in counts.items():
+        LeaderboardCounter.objects.get_or_create(board=board, object_id=object_id, date=day)
+        LeaderboardCounter.objects.filter(board=board, object_id=object_id, date=day).update(count=F('count') + count)
+    transaction.on_commit(lambda: update_top(board, list(counts)))
+
+
+#Only the objects whose counts just changed can move in the cached top lists.
+def update_top(board, object_ids):
+    with cache_lock(lock_key(board)):
+        for window in WINDOWS:
+            entries = get_leaderboard(board, window)
+            totals = dict(window_counters(board, window)
+                          .filter(object_id__in=object_ids)
+                          .values('object_id')
+                          .annotate(total=Sum('count'))
+                          .values_list('object_id', 'total'))
+            by_id = {entry['id']: entry for entry in entries}
+            new_ids = [object_id for object_id in totals if object_id not in by_id]
+            labels = get_labels(board, new_ids) if new_ids else {}
+            for object_id, total in totals.items():
+                if object_id in by_id:
+                    by_id[object_id]['count'] = total
+                else:
+                    by_id[object_id] = {'id': object_id, 'label': labels.get(object_id, ''), 'count': total}
+            top = sorted(by_id.values(), key=lambda entry: (-entry['count'], entry['id']))[:settings.LEADERBOARD_SIZE]
+            cache.set(cache_key(board, window), top, timeout=None)
+
+
+#Run by the outbox worker for the order.created event (events.py).
+def record_order(order_id):
+    order = RentOrder.objects.only('id', 'customer_id', 'rent_date').get(pk=order_id)
+    day = timezone.localtime(order.rent_date).date()
+    movies = {}
+    for movie_id, quantity in order.items.values_list('movie_id', 'quantity'):
+        movies[movie_id] = movies.get(movie_id, 0) + quantity
+    increment(LeaderboardCounter.BOARD_MOVIES, movies, day)
+    increment(LeaderboardCounter.BOARD_CUSTOMERS, {str(order.customer_id): 1}, day)
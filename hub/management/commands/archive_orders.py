@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from hub.archive import archive_batch
+
+
+#Moves returned and paid orders rented more than --days ago into the archive tables, a batch per
+# transaction so that locks stay short and an interrupted run keeps the batches already done.
+#Meant to be run nightly.
+class Command(BaseCommand):
+    help = 'Archives old returned and paid rental orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS, help='Archive orders rented more than this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE, help='Orders moved per transaction.')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        total = 0
+        while True:
+            moved = archive_batch(before, options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            self.stdout.write(f'Archived {total} orders.')
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} orders in total.'))
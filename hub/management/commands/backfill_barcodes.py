@@ -0,0 +1,33 @@
+import os
+from django.core.management.base import BaseCommand
+from hub.barcodes import barcode_code, barcode_path, render_missing_barcodes
+from hub.models import Movie
+
+
+#Gives every movie its deterministic barcode and renders the images that are missing from storage.
+#Rendering is spread over a process pool, one worker per core by default.
+class Command(BaseCommand):
+    help = 'Renders missing movie barcodes in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        outdated = []
+        codes = []
+        for movie in Movie.objects.only('id', 'barcode').iterator(chunk_size=batch_size):
+            code = barcode_code(movie.id)
+            codes.append(code)
+            if movie.barcode.name != barcode_path(code):
+                movie.barcode.name = barcode_path(code)
+                outdated.append(movie)
+
+        #bulk_update skips save() so the movies aren't queued for rendering a second time.
+        Movie.objects.bulk_update(outdated, ['barcode'], batch_size=batch_size)
+        rendered = render_missing_barcodes(codes, workers=options['workers'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {len(outdated)} movies and rendered {rendered} barcodes.'
+        ))
@@ -0,0 +1,77 @@
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from hub.carts import DatabaseCartStore
+from hub.models import Cart, CartItem, Movie
+from hub.pricing import line_totals, order_total, round_price
+
+
+#Times reading a cart with hundreds of items through the DatabaseCartStore, which has the
+# database compute the line and cart totals, against the earlier path: the items with their full
+# movies prefetched and the totals summed in Python. The movies and the cart are added inside a
+# transaction that is rolled back at the end, so the database is left as it was.
+#   python manage.py benchmark_carts --items 100 500 1000
+class Command(BaseCommand):
+    help = 'Benchmarks reading large carts with SQL totals against totals summed in Python.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[100, 300, 1000], help='Items in the carts.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        store = DatabaseCartStore()
+        with transaction.atomic():
+            self.stdout.write(f'{"items":>6} {"read":>10} {"sql ms":>8} {"queries":>8} {"python ms":>10} {"queries":>8}')
+            for count in options['items']:
+                cart_id = self.seed(count)
+                for name, (sql, python) in [('get_cart', (lambda: self.sql_cart(store, cart_id), lambda: self.python_cart(cart_id))),
+                                            ('list_items', (lambda: self.sql_items(store, cart_id), lambda: self.python_items(cart_id)))]:
+                    #The two paths may list the items in different orders, and SQLite sums decimals as
+                    # floats, which the serializers round to cents anyway.
+                    if sorted(map(round_price, sql())) != sorted(python()):
+                        self.stderr.write(f'{name}: the two paths disagree on the totals of the {count} item cart.')
+                    (sql_ms, sql_queries) = self.measure(sql, options['repeat'])
+                    (python_ms, python_queries) = self.measure(python, options['repeat'])
+                    self.stdout.write(f'{count:>6} {name:>10} {sql_ms:>8.2f} {sql_queries:>8} {python_ms:>10.2f} {python_queries:>8}')
+            transaction.set_rollback(True)
+
+    def sql_cart(self, store, cart_id):
+        cart = store.get_cart(cart_id)
+        return [cart.total_price] + [item.total_price for item in cart.items.all()]
+
+    def python_cart(self, cart_id):
+        cart = Cart.objects.prefetch_related('items__movie').get(pk=cart_id)
+        items = cart.items.all()
+        lines = [(item.quantity, item.movie.daily_rental_rate) for item in items]
+        return [order_total(lines)] + [line_totals([line])[0] for line in lines]
+
+    def sql_items(self, store, cart_id):
+        return [item.total_price for item in store.list_items(cart_id)]
+
+    def python_items(self, cart_id):
+        items = CartItem.objects.filter(cart_id=cart_id).select_related('movie')
+        return [line_totals([(item.quantity, item.movie.daily_rental_rate)])[0] for item in items]
+
+    def measure(self, read, repeat):
+        timings = []
+        for i in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                read()
+                timings.append((time.perf_counter() - started) * 1000)
+        return (statistics.median(timings), len(queries))
+
+    #A movie per item, with a few different prices and quantities.
+    def seed(self, count):
+        rates = [Decimal('1.99'), Decimal('2.49'), Decimal('3.99'), Decimal('4.99')]
+        start = Movie.objects.filter(pk__startswith='y').count()
+        movies = Movie.objects.bulk_create([
+            Movie(id=f'y{start + i:04d}', title=f'Benchmark {start + i}', description='Synthetic movie ' * 20,
+                  daily_rental_rate=rates[i % len(rates)], inventory=1)
+            for i in range(count)])
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create([CartItem(cart=cart, movie=movie, quantity=1 + i % 3) for i, movie in enumerate(movies)])
+        return cart.pk
@@ -0,0 +1,96 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+from hub.models import Cart, CartItem, Customer, Movie, OutboxEvent, RentOrder, RentOrderItem
+from hub.serializers import CreateRentOrderSerializer
+
+
+#Checkout throughput with concurrent clients: --threads customers check out --carts carts filled
+# beforehand with --items movies each, through CreateRentOrderSerializer as the hub/rentorders/
+# endpoint does. Reports the checkouts per second and fails if more copies left the stock than
+# the orders hold. Lower --stock to have the clients race for the last copies.
+#The movies, customers, carts and orders are created for the run and deleted afterwards. Needs a
+# database that allows concurrent writers (MySQL, PostgreSQL); SQLite reports most attempts as errors.
+#   python manage.py benchmark_checkout --threads 16 --carts 2000 --items 5
+class Command(BaseCommand):
+    help = 'Benchmarks concurrent checkouts of pre-filled carts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--carts', type=int, default=200)
+        parser.add_argument('--items', type=int, default=3, help='Movies in each cart.')
+        parser.add_argument('--movies', type=int, default=20, help='Titles the carts are filled from.')
+        parser.add_argument('--stock', type=int, default=1000, help='Copies of each title.')
+
+    def handle(self, *args, **options):
+        if options['items'] > options['movies']:
+            raise CommandError('--items can not be more than --movies.')
+        movie_ids = [f'zc{i:03d}' for i in range(options['movies'])]
+        if Movie.objects.filter(pk__in=movie_ids).exists():
+            raise CommandError('Benchmark movies from an earlier run are still there.')
+        Movie.objects.bulk_create([Movie(id=movie_id, title=f'Benchmark {movie_id}', description='',
+                                         daily_rental_rate=Decimal('1.00'), inventory=options['stock'])
+                                   for movie_id in movie_ids])
+        User = get_user_model()
+        users = [User.objects.create_user(f'benchmark-checkout-{i}', f'benchmark-checkout-{i}@example.com')
+                 for i in range(options['threads'])]
+        carts = Cart.objects.bulk_create([Cart() for i in range(options['carts'])])
+        try:
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, movie_id=movie_ids[(n + i) % len(movie_ids)], quantity=1)
+                for n, cart in enumerate(carts) for i in range(options['items'])])
+            self.run(movie_ids, users, [cart.pk for cart in carts], options)
+        finally:
+            orders = RentOrder.objects.filter(customer__user__in=users)
+            OutboxEvent.objects.filter(payload__order_id__in=list(orders.values_list('pk', flat=True))).delete()
+            RentOrderItem.objects.filter(rent_order__in=orders).delete()
+            orders.delete()
+            Cart.objects.filter(pk__in=[cart.pk for cart in carts]).delete()
+            Customer.objects.filter(user__in=users).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            Movie.objects.filter(pk__in=movie_ids).delete()
+
+    def run(self, movie_ids, users, cart_ids, options):
+        counts = {'created': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def checkout(user, carts):
+            try:
+                for cart_id in carts:
+                    serializer = CreateRentOrderSerializer(data={'cart_id': cart_id}, context={'user_id': user.pk})
+                    try:
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save()
+                        outcome = 'created'
+                    except ValidationError:
+                        outcome = 'rejected'
+                    except DatabaseError:
+                        outcome = 'errors'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = options['threads']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(checkout, users, [cart_ids[i::threads] for i in range(threads)]))
+        elapsed = time.perf_counter() - started
+
+        total_stock = options['stock'] * len(movie_ids)
+        remaining = Movie.objects.filter(pk__in=movie_ids).aggregate(remaining=Sum('inventory'))['remaining']
+        rented = (RentOrderItem.objects.filter(rent_order__customer__user__in=users)
+                  .aggregate(rented=Sum('quantity'))['rented'] or 0)
+        self.stdout.write(f'{len(cart_ids)} checkouts of {options["items"]} movies on {threads} threads in {elapsed:.2f}s, '
+                          f'{len(cart_ids) / elapsed:.0f} checkouts/s')
+        self.stdout.write(f"{counts['created']} orders, {counts['rejected']} rejected, {counts['errors']} errors, "
+                          f'{rented} copies rented, {remaining} of {total_stock} copies left')
+        if remaining < 0 or remaining + rented != total_stock:
+            raise CommandError('The stock does not match the orders.')
+        self.stdout.write(self.style.SUCCESS('Stock matches the orders.'))
@@ -0,0 +1,73 @@
+import statistics
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+from hub.models import Customer, Genre, Movie, RentOrder, RentOrderItem
+
+
+#Payload size and latency of a page of movies and of rent orders, with the full representation
+# and with a sparse fieldset (?fields=). The catalog cache is cleared before every request, so
+# the pages are read from the database each time. Movies, genres and orders are added inside a
+# transaction that is rolled back at the end, so the database is left as it was.
+#   python manage.py benchmark_fieldsets --movies 10000 --orders 2000
+class Command(BaseCommand):
+    help = 'Benchmarks payload size and latency with and without sparse fieldsets.'
+
+    URLS = [
+        ('/hub/movies/', ''),
+        ('/hub/movies/', '?fields=id,title,daily_rental_rate'),
+        ('/hub/rentorders/', ''),
+        ('/hub/rentorders/', '?fields=id,rent_date,order_status,payment_status'),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10000, help='Synthetic movies to add for the run.')
+        parser.add_argument('--orders', type=int, default=2000, help='Synthetic orders to add for the run.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            client = APIClient()
+            client.force_authenticate(self.seed(options['movies'], options['orders']))
+
+            self.stdout.write(f'{"page":<66} {"bytes":>8} {"ms":>8}')
+            for path, query in self.URLS:
+                (size, latency) = self.measure(client, path + query, options['repeat'])
+                self.stdout.write(f'{path + (query or " (full)"):<66} {size:>8} {latency:>8.2f}')
+            transaction.set_rollback(True)
+        cache.clear()
+
+    def measure(self, client, url, repeat):
+        timings = []
+        for i in range(repeat):
+            cache.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.content
+        return (len(response.content), statistics.median(timings))
+
+    #Movies with a couple of genres and a longer description, orders with three movies each.
+    #Returns a staff user, who sees every order.
+    def seed(self, movie_count, order_count):
+        genres = Genre.objects.bulk_create([Genre(title=f'Benchgenre {i}') for i in range(10)])
+        movies = Movie.objects.bulk_create([
+            Movie(id=f'w{i:04d}', title=f'Benchmark movie {i}', description='A synthetic movie for the benchmark. ' * 5,
+                  daily_rental_rate=Decimal('2.99'), inventory=5)
+            for i in range(movie_count)], batch_size=5000)
+        Through = Movie.genres.through
+        Through.objects.bulk_create([Through(movie_id=movie.pk, genre_id=genres[(n + i) % len(genres)].pk)
+                                     for n, movie in enumerate(movies) for i in range(2)], batch_size=5000)
+
+        User = get_user_model()
+        user = User.objects.create_user('benchmark-fieldsets', 'benchmark-fieldsets@example.com', is_staff=True)
+        customer = Customer.objects.create(user=user)
+        orders = RentOrder.objects.bulk_create([RentOrder(customer=customer) for i in range(order_count)], batch_size=5000)
+        RentOrderItem.objects.bulk_create([
+            RentOrderItem(rent_order=order, movie=movies[(n + i) % len(movies)], quantity=1, unit_price=Decimal('2.99'))
+            for n, order in enumerate(orders) for i in range(3)], batch_size=5000)
+        return user
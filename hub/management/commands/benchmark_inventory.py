@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from hub.inventory import InsufficientInventory, reserve_inventory
+from hub.models import Movie
+
+
+#Stress test of the stock reservation: --threads threads race to reserve one copy at a time of
+# --movies titles holding --stock copies each, asking for more copies than there are. Reports
+# the reservations per second and fails if more copies were handed out than existed.
+#The movies are created for the run and deleted afterwards. Needs a database that allows
+# concurrent writers (MySQL, PostgreSQL); SQLite reports most attempts as errors.
+#   python manage.py benchmark_inventory --threads 16 --stock 500 --attempts 2000
+class Command(BaseCommand):
+    help = 'Benchmarks concurrent inventory reservations and checks that nothing is oversold.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--movies', type=int, default=1, help='Titles the threads compete for.')
+        parser.add_argument('--stock', type=int, default=100, help='Copies of each title.')
+        parser.add_argument('--attempts', type=int, default=300, help='Reservations tried in total.')
+
+    def handle(self, *args, **options):
+        movie_ids = [f'zb{i:03d}' for i in range(options['movies'])]
+        if Movie.objects.filter(pk__in=movie_ids).exists():
+            raise CommandError('Benchmark movies from an earlier run are still there.')
+        Movie.objects.bulk_create([Movie(id=movie_id, title=f'Benchmark {movie_id}', description='',
+                                         daily_rental_rate=Decimal('1.00'), inventory=options['stock'])
+                                   for movie_id in movie_ids])
+        try:
+            self.run(movie_ids, options)
+        finally:
+            Movie.objects.filter(pk__in=movie_ids).delete()
+
+    def run(self, movie_ids, options):
+        counts = {'reserved': 0, 'sold_out': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def reserve(attempts):
+            try:
+                for attempt in attempts:
+                    try:
+                        reserve_inventory([(movie_ids[attempt % len(movie_ids)], 1)])
+                        outcome = 'reserved'
+                    except InsufficientInventory:
+                        outcome = 'sold_out'
+                    except DatabaseError:
+                        outcome = 'errors'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = options['threads']
+        attempts = list(range(options['attempts']))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(reserve, [attempts[i::threads] for i in range(threads)]))
+        elapsed = time.perf_counter() - started
+
+        total_stock = options['stock'] * len(movie_ids)
+        remaining = Movie.objects.filter(pk__in=movie_ids).aggregate(remaining=Sum('inventory'))['remaining']
+        self.stdout.write(f"{options['attempts']} attempts on {threads} threads in {elapsed:.2f}s, "
+                          f"{options['attempts'] / elapsed:.0f} reservations/s")
+        self.stdout.write(f"{counts['reserved']} reserved, {counts['sold_out']} sold out, {counts['errors']} errors, "
+                          f"{remaining} of {total_stock} copies left")
+        if counts['reserved'] > total_stock or remaining < 0 or counts['reserved'] + remaining != total_stock:
+            raise CommandError('Oversold: more copies were reserved than were in stock.')
+        self.stdout.write(self.style.SUCCESS('No oversell.'))
@@ -0,0 +1,72 @@
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from hub.models import Movie
+from hub.pagination import MovieCursorPagination
+
+
+#Compares the cost of reading a deep page of movies with the keyset pagination and with the
+# COUNT(*) + OFFSET of PageNumberPagination. Synthetic movies are added inside a transaction
+# that is rolled back at the end, so the database is left as it was.
+#   python manage.py benchmark_pagination --movies 100000 --pages 1 100 10000
+class Command(BaseCommand):
+    help = 'Benchmarks keyset against offset pagination of the movie list.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=100000, help='Synthetic movies to add for the run.')
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+        parser.add_argument('--ordering', default='daily_rental_rate')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['movies'])
+            paginator = MovieCursorPagination()
+            paginator.ordering = options['ordering']
+            paginator.keys = paginator.get_keys((options['ordering'],))
+            ordered = Movie.objects.order_by(*[('-' if descending else '') + name for name, descending in paginator.keys])
+            total = Movie.objects.count()
+
+            self.stdout.write(f'{total} movies, {paginator.page_size} per page, ordered by {options["ordering"]}')
+            self.stdout.write(f'{"page":>8} {"keyset ms":>10} {"offset ms":>10}')
+            for page in options['pages']:
+                offset = (page - 1) * paginator.page_size
+                if offset >= total:
+                    break
+                params = {}
+                if page > 1:
+                    params['cursor'] = paginator.make_cursor(paginator.row_position(ordered[offset - 1]), False)
+                request = Request(APIRequestFactory().get('/hub/movies/', params))
+
+                keyset = self.measure(lambda: paginator.paginate_queryset(Movie.objects.all(), request), options['repeat'])
+                offset_time = self.measure(lambda: (Movie.objects.count(), list(ordered[offset:offset + paginator.page_size])), options['repeat'])
+                self.stdout.write(f'{page:>8} {keyset:>10.2f} {offset_time:>10.2f}')
+            transaction.set_rollback(True)
+
+    def measure(self, read, repeat):
+        timings = []
+        for i in range(repeat):
+            started = time.perf_counter()
+            read()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    #Movie ids are 5 characters, the synthetic ones are 'x' and a base 36 number. A handful of
+    # prices, so that most movies share their daily_rental_rate with many others.
+    def seed(self, count):
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+        rates = [Decimal('1.99'), Decimal('2.99'), Decimal('3.99'), Decimal('4.99')]
+        movies = []
+        for i in range(count):
+            code = ''
+            for position in range(4):
+                code = digits[i // 36 ** position % 36] + code
+            movies.append(Movie(id=f'x{code}', title=f'Benchmark {i}', description='', daily_rental_rate=rates[i % len(rates)], inventory=1))
+            if len(movies) == 5000:
+                Movie.objects.bulk_create(movies)
+                movies = []
+        Movie.objects.bulk_create(movies)
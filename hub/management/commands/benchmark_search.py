@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from hub.models import Genre, Movie, SearchTerm
+from hub.search import MovieSearchFilter, build_terms
+
+
+#Compares the inverted index search (MovieSearchFilter) with rest_framework's SearchFilter on
+# ['title', 'genres__title'], the icontains lookups it replaced, reading the first page of
+# results for a few kinds of searches. Synthetic movies, genres and their index rows are added
+# inside a transaction that is rolled back at the end, so the database is left as it was.
+#   python manage.py benchmark_search --movies 200000 --searches kor "kor vel" drama
+class Command(BaseCommand):
+    help = 'Benchmarks the movie search index against SearchFilter.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=100000, help='Synthetic movies to add for the run.')
+        parser.add_argument('--searches', nargs='+', help='Searches to time, by default a mix of common, rare, '
+                                                            'several word, prefix and genre searches.')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            words = self.seed(options['movies'])
+            searches = options['searches'] or [words[0], words[-1], f'{words[0]} {words[1]}', words[0][:2], 'Benchgenre 3']
+            factory = APIRequestFactory()
+            view = type('MovieView', (), {'search_fields': ['title', 'genres__title']})()
+
+            self.stdout.write(f'{Movie.objects.count()} movies, {SearchTerm.objects.count()} index rows')
+            #Ranked is the default ordering of searches, by title the ordering SearchFilter pages with.
+            self.stdout.write(f'{"search":>20} {"ranked ms":>10} {"by title ms":>12} {"SearchFilter ms":>16}')
+            for search in searches:
+                request = Request(factory.get('/hub/movies/', {'search': search}))
+                ranked = self.measure(lambda: list(MovieSearchFilter().filter_queryset(request, Movie.objects.all(), view)
+                                                   .order_by('-search_rank', 'pk')[:10]), options['repeat'])
+                by_title = self.measure(lambda: list(MovieSearchFilter().filter_queryset(request, Movie.objects.all(), view)
+                                                     .order_by('title', 'pk')[:10]), options['repeat'])
+                icontains = self.measure(lambda: list(SearchFilter().filter_queryset(request, Movie.objects.all(), view)
+                                                      .order_by('title', 'pk')[:10]), options['repeat'])
+                self.stdout.write(f'{search:>20} {ranked:>10.2f} {by_title:>12.2f} {icontains:>16.2f}')
+            transaction.set_rollback(True)
+
+    def measure(self, read, repeat):
+        timings = []
+        for i in range(repeat):
+            started = time.perf_counter()
+            read()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    #Titles and descriptions made of made up words, some much more common than others, and two
+    # genres per movie out of twenty. Returns the words, the most common first.
+    def seed(self, count):
+        generator = random.Random(0)
+        syllables = ['ka', 'lo', 'mi', 'ren', 'tas', 'vel', 'dor', 'sin', 'pa', 'qui', 'zor', 'bel']
+        words = sorted({''.join(generator.choice(syllables) for i in range(3)) for n in range(3000)})
+        #Zipf like: the first words are picked far more often than the last ones.
+        weights = [1 / (rank + 1) for rank in range(len(words))]
+        genres = Genre.objects.bulk_create([Genre(title=f'Benchgenre {i}') for i in range(20)])
+        Through = Movie.genres.through
+
+        for start in range(0, count, 5000):
+            movies = []
+            for i in range(start, min(start + 5000, count)):
+                title = ' '.join(generator.choices(words, weights, k=3)).title()
+                description = ' '.join(generator.choices(words, weights, k=8))
+                movies.append(Movie(id=self.movie_id(i), title=title,
+                                    description=description, daily_rental_rate=Decimal('2.99'), inventory=1))
+            Movie.objects.bulk_create(movies)
+            links = [(movie, generator.sample(genres, 2)) for movie in movies]
+            Through.objects.bulk_create([Through(movie_id=movie.pk, genre_id=genre.pk) for movie, picked in links for genre in picked])
+            SearchTerm.objects.bulk_create([term for movie, picked in links for term in build_terms(movie, [genre.title for genre in picked])],
+                                           batch_size=5000)
+        return words
+
+    #Movie ids are 5 characters, the synthetic ones are 'z' and a base 36 number.
+    def movie_id(self, number):
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+        code = ''
+        for position in range(4):
+            code = digits[number // 36 ** position % 36] + code
+        return f'z{code}'
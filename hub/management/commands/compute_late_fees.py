@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from hub.latefees import update_late_fees
+
+
+#Recomputes the late fee of every rental that hasn't been returned. Meant to be run nightly.
+class Command(BaseCommand):
+    help = 'Recomputes late fees of outstanding rentals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        checked, updated = update_late_fees(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} outstanding items, updated {updated} late fees.'))
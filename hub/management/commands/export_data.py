@@ -0,0 +1,33 @@
+import sys
+from datetime import date
+from django.core.management.base import BaseCommand
+from hub.exports import export_lines, movie_rows, order_rows
+
+
+#Writes the same streamed dumps as the hub/exports/ endpoints to a file or to stdout.
+#python manage.py export_data orders --output ndjson --start 2023-01-01 --file orders.ndjson
+class Command(BaseCommand):
+    help = 'Exports the orders or the movie catalog as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=['orders', 'movies'])
+        parser.add_argument('--output', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to export (YYYY-MM-DD).')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to export (YYYY-MM-DD).')
+        parser.add_argument('--order-status', help='Only orders with this order status (orders only).')
+        parser.add_argument('--payment-status', help='Only orders with this payment status (orders only).')
+        parser.add_argument('--file', help='Write to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['table'] == 'orders':
+            headers, rows = order_rows(options['start'], options['end'], options['order_status'], options['payment_status'])
+        else:
+            headers, rows = movie_rows(options['start'], options['end'])
+
+        out = open(options['file'], 'w', newline='') if options['file'] else sys.stdout
+        try:
+            for line in export_lines(options['output'], headers, rows):
+                out.write(line)
+        finally:
+            if options['file']:
+                out.close()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from hub.carts import get_cart_store
+
+
+#Writes carts that have been idle for CART_IDLE_TIMEOUT seconds from the cart store back to the
+# Cart and CartItem tables. Meant to be run every few minutes by cron or another scheduler.
+class Command(BaseCommand):
+    help = 'Writes idle carts from the cart store back to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        flushed = get_cart_store().flush_idle(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} idle carts.'))
@@ -0,0 +1,129 @@
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from hub.barcodes import barcode_code, barcode_path, render_missing_barcodes
+from hub.caching import bump_catalog_version
+from hub.genres import refresh_movie_counts
+from hub.models import Genre, Movie, SearchTerm
+from hub.search import build_terms
+
+
+#Bulk loads movies from a CSV or JSONL file. The file is read one row at a time and the movies,
+# their genre links and their search terms are written with bulk_create in batches, instead of
+# one Movie.save() (and one barcode render) per row.
+#
+#CSV files need a header with: id, title, description, daily_rental_rate, inventory and
+# optionally age_rating and genres, where genres are separated by '|'.
+#JSONL files have one object per line with the same keys, genres being a list of titles.
+
+MOVIE_FIELDS = ['title', 'description', 'daily_rental_rate', 'inventory', 'age_rating', 'barcode']
+
+
+class Command(BaseCommand):
+    help = 'Imports a movie catalog from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--update', action='store_true',
+                            help='Update movies that already exist instead of failing on them.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes used to render the barcodes once the rows are in.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        batch_size = options['batch_size']
+        self.update = options['update']
+
+        #Every genre title is resolved through this map, new genres are created the first time they show up.
+        self.genre_ids = {genre.title: genre.id for genre in Genre.objects.all()}
+
+        codes = []
+        batch = []
+        imported = 0
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = csv.DictReader(file) if file_format == 'csv' else (json.loads(line) for line in file if line.strip())
+            for line_number, row in enumerate(rows, start=1):
+                batch.append(self.parse_row(row, line_number))
+                if len(batch) >= batch_size:
+                    imported += self.write_batch(batch)
+                    codes += [barcode_code(movie.id) for movie, genres in batch]
+                    batch = []
+                    rate = imported / (time.monotonic() - started)
+                    self.stdout.write(f'{imported} movies imported, {rate:.0f} rows/sec')
+            if batch:
+                imported += self.write_batch(batch)
+                codes += [barcode_code(movie.id) for movie, genres in batch]
+
+        #bulk_create doesn't send the signals that invalidate the catalog cache.
+        transaction.on_commit(bump_catalog_version)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} movies in {elapsed:.1f}s ({imported / max(elapsed, 0.001):.0f} rows/sec).'
+        ))
+
+        rendered = render_missing_barcodes(codes, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} barcodes.'))
+
+    def parse_row(self, row, line_number):
+        try:
+            movie_id = str(row['id']).strip()
+            genres = row.get('genres') or []
+            if isinstance(genres, str):
+                genres = [title.strip() for title in genres.split('|') if title.strip()]
+            movie = Movie(
+                id=movie_id,
+                title=row['title'],
+                description=row.get('description') or '',
+                daily_rental_rate=Decimal(str(row['daily_rental_rate'])),
+                inventory=int(row['inventory']),
+                age_rating=row.get('age_rating') or Movie.AGE_RATING_GENERAL,
+                #Only the name is set here, the images are rendered at the end of the import.
+                barcode=barcode_path(barcode_code(movie_id)),
+            )
+        except (KeyError, ValueError, InvalidOperation) as error:
+            raise CommandError(f'Invalid row {line_number}: {error!r}')
+        return movie, genres
+
+    def get_genre_id(self, title):
+        if title not in self.genre_ids:
+            self.genre_ids[title] = Genre.objects.create(title=title).id
+        return self.genre_ids[title]
+
+    @transaction.atomic
+    def write_batch(self, batch):
+        movies = [movie for movie, genres in batch]
+        movie_ids = [movie.id for movie in movies]
+
+        if self.update:
+            options = {'update_conflicts': True, 'update_fields': MOVIE_FIELDS}
+            #MySQL's ON DUPLICATE KEY UPDATE doesn't take the conflicting columns.
+            if connection.features.supports_update_conflicts_with_target:
+                options['unique_fields'] = ['id']
+            Movie.objects.bulk_create(movies, **options)
+            old_links = Movie.genres.through.objects.filter(movie_id__in=movie_ids)
+            self.removed_genre_ids = set(old_links.values_list('genre_id', flat=True))
+            old_links.delete()
+            SearchTerm.objects.filter(movie_id__in=movie_ids).delete()
+        else:
+            Movie.objects.bulk_create(movies)
+            self.removed_genre_ids = set()
+
+        links = []
+        terms = []
+        for movie, genres in batch:
+            links += [Movie.genres.through(movie_id=movie.id, genre_id=self.get_genre_id(title)) for title in genres]
+            terms += build_terms(movie, genres)
+        Movie.genres.through.objects.bulk_create(links, ignore_conflicts=True)
+        SearchTerm.objects.bulk_create(terms)
+        #The through table was written without m2m_changed, so the touched genres are recounted.
+        refresh_movie_counts({link.genre_id for link in links} | self.removed_genre_ids)
+        return len(movies)
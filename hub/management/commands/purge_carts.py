@@ -0,0 +1,58 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from hub.models import Cart
+
+
+#Deletes carts abandoned for more than CART_RETENTION_DAYS days, with their items. Meant to be
+# scheduled (cron or another scheduler) once a day, e.g.
+#   0 3 * * * python manage.py purge_carts
+#
+#Carts are deleted in small chunks picked through the index on created_at, each in its own short
+# transaction, with a pause between chunks to stay under --rows-per-second, so checkout never
+# waits behind one huge DELETE.
+#A run that is stopped can be resumed by running it again: every chunk only deletes carts that
+# are still older than the cutoff, and --before pins the cutoff printed by the first run.
+class Command(BaseCommand):
+    help = 'Deletes abandoned carts in throttled chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CART_RETENTION_DAYS)
+        parser.add_argument('--before', help='Delete carts created before this ISO datetime instead of using --days.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--rows-per-second', type=int, default=settings.CART_PURGE_ROWS_PER_SECOND)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the carts that would be deleted.')
+
+    def handle(self, *args, **options):
+        cutoff = parse_datetime(options['before']) if options['before'] else timezone.now() - timedelta(days=options['days'])
+        #Carts whose items still live in the cart cache aren't abandoned, whatever their age.
+        abandoned = Cart.objects.filter(created_at__lt=cutoff, cached=False)
+
+        if options['dry_run']:
+            self.stdout.write(f'{abandoned.count()} carts created before {cutoff.isoformat()} would be deleted.')
+            return
+
+        self.stdout.write(f'Deleting carts created before {cutoff.isoformat()}')
+        chunk_size = options['chunk_size']
+        min_chunk_time = chunk_size / options['rows_per_second']
+        deleted = 0
+        while True:
+            started = time.monotonic()
+            with transaction.atomic():
+                cart_ids = list(abandoned.order_by('created_at').values_list('pk', flat=True)[:chunk_size])
+                if not cart_ids:
+                    break
+                #The CartItem rows are removed by the cascade in the same transaction.
+                Cart.objects.filter(pk__in=cart_ids).delete()
+            deleted += len(cart_ids)
+            self.stdout.write(f'{deleted} carts deleted')
+
+            elapsed = time.monotonic() - started
+            if elapsed < min_chunk_time:
+                time.sleep(min_chunk_time - elapsed)
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} abandoned carts.'))
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from hub.history import refresh_customer_summaries
+
+
+#Recounts every customer's CustomerSummary from the orders, for existing data. Day to day the
+# summaries are kept up to date by the signals.
+class Command(BaseCommand):
+    help = 'Rebuilds the per-customer order summaries from the order history.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = refresh_customer_summaries()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} customer summaries.'))
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.core.management.base import BaseCommand
+from hub.archive import order_history_totals
+from hub.models import DailyRevenue, RentOrder
+
+
+#Rebuilds the DailyRevenue rows from the whole order history, for existing data. Day to day the
+# rows are kept up to date by the signals as payments complete.
+class Command(BaseCommand):
+    help = 'Rebuilds the daily revenue rollups from the order history.'
+
+    def handle(self, *args, **options):
+        #Archived orders are all complete, so most of the older revenue comes from them.
+        days = order_history_totals(
+            lambda order_model, item_model: (item_model.objects
+                                             .filter(rent_order__payment_status=RentOrder.PAYMENT_STATUS_COMPLETE)
+                                             .annotate(date=TruncDate('rent_order__rent_date'))
+                                             .values('date')
+                                             .annotate(
+                                                 day_orders=Count('rent_order_id', distinct=True),
+                                                 day_quantity=Sum('quantity'),
+                                                 day_revenue=Sum(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+                                             )
+                                             .order_by()),
+            'date', ['day_orders', 'day_quantity', 'day_revenue'])
+        rows = [DailyRevenue(date=date, order_count=day['day_orders'], quantity=day['day_quantity'],
+                             gross_revenue=day['day_revenue'])
+                for date, day in sorted(days.items())]
+        with transaction.atomic():
+            DailyRevenue.objects.all().delete()
+            DailyRevenue.objects.bulk_create(rows, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(rows)} days of revenue.'))
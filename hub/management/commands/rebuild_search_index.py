@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from hub.models import Movie
+from hub.search import index_movies
+
+
+#Builds the movie search index from scratch, for existing catalogs or after changing the weights
+# in search.py. Day to day the index is kept up to date by the signals.
+class Command(BaseCommand):
+    help = 'Rebuilds the search index for every movie in the catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        movie_ids = list(Movie.objects.values_list('pk', flat=True).order_by('pk'))
+        for start in range(0, len(movie_ids), batch_size):
+            index_movies(movie_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(movie_ids)} movies.'))
@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Cast, TruncDate
+from django.db.models import CharField
+from django.core.management.base import BaseCommand
+from hub.archive import order_history_totals
+from hub.leaderboards import refresh_leaderboards
+from hub.models import LeaderboardCounter
+
+
+#Rebuilds the cached top movies and top customers from the daily counters. Meant to be run
+# periodically (e.g. hourly) so that days leaving the week and month windows drop out.
+#With --rebuild the counters themselves are first recomputed from the order history.
+class Command(BaseCommand):
+    help = 'Refreshes the cached leaderboards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute the counters from the order history first.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.rebuild_counters()
+        refresh_leaderboards()
+        self.stdout.write(self.style.SUCCESS('Leaderboards refreshed.'))
+
+    def rebuild_counters(self):
+        #Archived orders still count towards the all-time leaderboards.
+        movies = order_history_totals(
+            lambda order_model, item_model: (item_model.objects
+                                             .annotate(day=TruncDate('rent_order__rent_date'))
+                                             .values('movie_id', 'day')
+                                             .annotate(total=Sum('quantity'))
+                                             .order_by()),
+            ('movie_id', 'day'), ['total'])
+        customers = order_history_totals(
+            lambda order_model, item_model: (order_model.objects
+                                             .annotate(day=TruncDate('rent_date'), object_id=Cast('customer_id', CharField()))
+                                             .values('object_id', 'day')
+                                             .annotate(total=Count('id'))
+                                             .order_by()),
+            ('object_id', 'day'), ['total'])
+        counters = [LeaderboardCounter(board=LeaderboardCounter.BOARD_MOVIES, object_id=movie_id, date=day, count=row['total'])
+                    for (movie_id, day), row in movies.items()]
+        counters += [LeaderboardCounter(board=LeaderboardCounter.BOARD_CUSTOMERS, object_id=object_id, date=day, count=row['total'])
+                     for (object_id, day), row in customers.items()]
+        with transaction.atomic():
+            LeaderboardCounter.objects.all().delete()
+            LeaderboardCounter.objects.bulk_create(counters, batch_size=1000)
+        self.stdout.write(f'Rebuilt {len(counters)} counters.')
@@ -0,0 +1,39 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from hub.outbox import create_pool, outbox_stats, process_batch, purge_processed
+
+
+#Handles the order events written to the outbox (see hub/outbox.py). Meant to run all the time
+# under a process supervisor, several copies can run side by side since each claims its own
+# batches. With --once it drains the events that are due and exits instead, e.g. from cron.
+#After each batch it reports the events handled and failed, and the lag: the events still
+# waiting and how long the oldest of them has waited.
+class Command(BaseCommand):
+    help = 'Handles the order events waiting in the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.OUTBOX_WORKERS, help='Events handled at the same time.')
+        parser.add_argument('--processes', action='store_true', help='Use worker processes instead of threads.')
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when there is nothing to do.')
+        parser.add_argument('--once', action='store_true', help='Exit once no event is due.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        with create_pool(workers, options['processes']) as pool:
+            while True:
+                (processed, failed) = process_batch(pool, workers, options['batch_size'])
+                if processed or failed:
+                    stats = outbox_stats()
+                    self.stdout.write(f"{processed} events handled, {failed} failed; {stats['pending']} waiting, "
+                                      f"lag {stats['lag_seconds']:.1f}s, {stats['failed']} given up on")
+                    continue
+
+                purge_processed(settings.OUTBOX_RETENTION_DAYS)
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+        stats = outbox_stats()
+        self.stdout.write(self.style.SUCCESS(f"Outbox drained; {stats['pending']} waiting, {stats['failed']} given up on."))
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:21
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0011_alter_rentorderitem_rent_order'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='daily_rental_rate',
+            field=models.DecimalField(db_index=True, decimal_places=2, max_digits=6, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='title',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='rentorder',
+            name='rent_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
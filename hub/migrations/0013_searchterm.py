@@ -0,0 +1,26 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0012_movie_rentorder_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='hub.movie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'movie'], name='hub_searcht_term_8b3996_idx')],
+            },
+        ),
+    ]
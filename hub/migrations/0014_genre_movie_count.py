@@ -0,0 +1,32 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:28
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_genre_movies(apps, schema_editor):
+    Genre = apps.get_model('hub', 'Genre')
+    Movie = apps.get_model('hub', 'Movie')
+    links = (Movie.genres.through.objects
+             .filter(genre_id=OuterRef('pk'))
+             .values('genre_id')
+             .annotate(count=Count('movie_id'))
+             .values('count'))
+    Genre.objects.update(movie_count=Coalesce(Subquery(links), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0013_searchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genre',
+            name='movie_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_genre_movies, migrations.RunPython.noop),
+    ]
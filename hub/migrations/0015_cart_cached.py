@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0014_genre_movie_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='cached',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0016_cart_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentorder',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='rentorder',
+            unique_together={('customer', 'idempotency_key')},
+        ),
+    ]
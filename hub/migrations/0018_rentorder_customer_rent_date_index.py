@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0017_rentorder_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rentorder',
+            index=models.Index(fields=['customer', 'rent_date'], name='hub_rentord_custome_cbee4d_idx'),
+        ),
+    ]
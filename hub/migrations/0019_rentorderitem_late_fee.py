@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0018_rentorder_customer_rent_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentorderitem',
+            name='late_fee',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0020_dailyrevenue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('movies', 'Movies'), ('customers', 'Customers')], max_length=10)),
+                ('object_id', models.CharField(max_length=20)),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', 'date'], name='hub_leaderb_board_d7b3b3_idx')],
+                'unique_together': {('board', 'object_id', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def summarize_customers(apps, schema_editor):
+    CustomerSummary = apps.get_model('hub', 'CustomerSummary')
+    RentOrder = apps.get_model('hub', 'RentOrder')
+    RentOrderItem = apps.get_model('hub', 'RentOrderItem')
+    spent = (RentOrderItem.objects
+             .filter(rent_order__customer_id=OuterRef('customer_id'), rent_order__payment_status='C')
+             .values('rent_order__customer_id')
+             .annotate(total=Sum(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=12, decimal_places=2)))
+             .values('total'))
+    rows = (RentOrder.objects
+            .values('customer_id')
+            .annotate(
+                rentals=Count('id'),
+                open=Count('id', filter=Q(order_status='C')),
+                spent=Coalesce(Subquery(spent), 0, output_field=DecimalField(max_digits=12, decimal_places=2)),
+            )
+            .order_by())
+    CustomerSummary.objects.bulk_create(
+        [CustomerSummary(customer_id=row['customer_id'], total_rentals=row['rentals'],
+                         open_rentals=row['open'], total_spent=row['spent'])
+         for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0021_leaderboardcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSummary',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='hub.customer')),
+                ('total_rentals', models.PositiveIntegerField(default=0)),
+                ('open_rentals', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+        ),
+        migrations.RunPython(summarize_customers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0022_customersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRentOrder',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('order_status', models.CharField(choices=[('C', 'Collected'), ('L', 'Lost'), ('R', 'Returned')], max_length=1)),
+                ('rent_date', models.DateTimeField()),
+                ('return_date', models.DateTimeField(blank=True, null=True)),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('C', 'Complete'), ('F', 'Failed')], max_length=1)),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archivedrentorders', to='hub.customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedRentOrderItem',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveSmallIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('late_fee', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archivedrentorderitems', to='hub.movie')),
+                ('rent_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='hub.archivedrentorder')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedrentorder',
+            index=models.Index(fields=['customer', 'rent_date'], name='hub_archive_custome_ebb1c7_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-18 04:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('hub', '0024_outboxevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockedUser',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='block', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('blocked_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+from collections import Counter
+from django.db import migrations
+
+
+#Indexes the movies that existed before the search index was added (0013), so that ?search=
+# works for the whole catalog straight after deploying. Same weights as hub/search.py.
+def index_existing_movies(apps, schema_editor):
+    from hub.search import DESCRIPTION_WEIGHT, GENRE_WEIGHT, TITLE_WEIGHT, tokenize
+
+    Movie = apps.get_model('hub', 'Movie')
+    SearchTerm = apps.get_model('hub', 'SearchTerm')
+    indexed = SearchTerm.objects.values('movie_id')
+    movie_ids = list(Movie.objects.exclude(pk__in=indexed).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(movie_ids), 500):
+        terms = []
+        movies = Movie.objects.filter(pk__in=movie_ids[start:start + 500]).only('id', 'title', 'description').prefetch_related('genres')
+        for movie in movies:
+            weights = Counter()
+            for token in tokenize(movie.title):
+                weights[token] += TITLE_WEIGHT
+            for genre in movie.genres.all():
+                for token in tokenize(genre.title):
+                    weights[token] += GENRE_WEIGHT
+            for token in tokenize(movie.description):
+                weights[token] += DESCRIPTION_WEIGHT
+            terms += [SearchTerm(term=term, movie_id=movie.pk, weight=weight) for term, weight in weights.items()]
+        SearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0025_blockeduser'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing_movies, migrations.RunPython.noop),
+    ]
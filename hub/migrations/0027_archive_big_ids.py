@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0026_backfill_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedrentorder',
+            name='id',
+            field=models.BigIntegerField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='archivedrentorderitem',
+            name='id',
+            field=models.BigIntegerField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.3 on 2026-10-18 05:19
+
+from django.db import migrations, models
+
+
+#Orders returned before the flag existed were already put back in stock, unless their
+# order.returned event hasn't been handled yet.
+def mark_returned_orders(apps, schema_editor):
+    OutboxEvent = apps.get_model('hub', 'OutboxEvent')
+    RentOrder = apps.get_model('hub', 'RentOrder')
+    pending = OutboxEvent.objects.filter(topic='order.returned', processed_at__isnull=True).values_list('payload__order_id', flat=True)
+    RentOrder.objects.filter(order_status='R').exclude(pk__in=list(pending)).update(restocked=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hub', '0027_archive_big_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentorder',
+            name='restocked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_returned_orders, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,10 @@
-import random
 from django.conf import settings
 from django.contrib import admin
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
-import barcode
-from barcode.writer import ImageWriter
-from io import BytesIO
-from django.core.files import File
+from django.db import models, transaction
+from django.utils import timezone
 from uuid import uuid4
+from .barcodes import barcode_code, barcode_path, schedule_barcode
 
 # Create your models here.
 
@@ -20,6 +17,9 @@ class Promotion(models.Model):
 
 class Genre(models.Model):
     title = models.CharField(max_length=255)
+    #Number of movies in the genre, kept up to date by the signals in signals.py so that listing
+    # genres never has to count the movies table.
+    movie_count = models.PositiveIntegerField(default=0, editable=False)
    
     def __str__(self):
         return str(self.title)
@@ -42,11 +42,12 @@ class Movie(models.Model):
 
     id = models.CharField(max_length=5, primary_key=True)
     barcode = models.ImageField(upload_to='images/', blank=True)
-    title = models.CharField(max_length=255)
+    #The ordering fields are indexed so that the cursor pagination can seek straight to a position.
+    title = models.CharField(max_length=255, db_index=True)
     description = models.TextField()
-    daily_rental_rate = models.DecimalField(max_digits=6, decimal_places=2, validators=[MinValueValidator(1)])
+    daily_rental_rate = models.DecimalField(max_digits=6, decimal_places=2, validators=[MinValueValidator(1)], db_index=True)
     inventory = models.IntegerField(validators=[MinValueValidator(0)])
-    last_updated = models.DateTimeField(auto_now=True)
+    last_updated = models.DateTimeField(auto_now=True, db_index=True)
     age_rating  = models.CharField(max_length=4, choices=AGE_RATING_CHOICES, default=AGE_RATING_GENERAL)
     genres = models.ManyToManyField(Genre, related_name='movie')
     
@@ -57,21 +58,47 @@ class Movie(models.Model):
     
     class Meta:
         ordering = ['title']
+
+    SEARCH_FIELDS = ['title', 'description']
     
 
+    #Remembering the id the movie was loaded with, so that save can tell whether it changed, and
+    # the searchable fields, so that the search index is only rebuilt when they change.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_id = instance.id
+        instance._saved_search_fields = {name: instance.__dict__.get(name) for name in cls.SEARCH_FIELDS}
+        return instance
+
+    #The barcode only depends on the id, so it is only set for new movies, movies whose id
+    # changed and movies that don't have one yet. The image itself is rendered in the
+    # background once the transaction commits.
     def save(self, *args, **kwargs):
-        EAN = barcode.get_barcode_class('ean13')
-        code = ''.join(random.choice('0123456789') for _ in range(10))
-        total = [int(code[i]) * 3 if i % 2 == 0 else int(code[i]) for i in range(10)]
-        unpacked_total = int(''.join(map(str, total)))
-        ean = EAN(f'{unpacked_total}{self.id}', writer=ImageWriter())
-        buffer = BytesIO()
-        ean.write(buffer)
-        self.barcode.save(f'{self.title}.png', File(buffer), save=False)
-        return super().save(*args, **kwargs)
+        needs_barcode = self._state.adding or self.id != getattr(self, '_saved_id', None) or not self.barcode
+        if needs_barcode:
+            code = barcode_code(self.id)
+            self.barcode.name = barcode_path(code)
+        super().save(*args, **kwargs)
+        self._saved_id = self.id
+        if needs_barcode:
+            transaction.on_commit(lambda: schedule_barcode(code))
 
 
 
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=64)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        #term first so prefix lookups (LIKE 'term%') can use the index, and movie second so
+        # the matching movie ids are read straight from the index.
+        indexes = [
+            models.Index(fields=['term', 'movie'])
+        ]
+
+
 class Customer(models.Model):
     age = models.PositiveIntegerField(validators=[MinValueValidator(3), MaxValueValidator(100)], null=True, blank=True)
     phone = models.CharField(max_length=255)
@@ -120,15 +147,85 @@ class RentOrder(models.Model):
     ]
 
     order_status = models.CharField(max_length=1, choices=ORDER_STATUS_CHOICES, default=ORDER_STATUS_COLLECTED)
-    rent_date = models.DateTimeField(auto_now_add=True)
+    rent_date = models.DateTimeField(auto_now_add=True, db_index=True)
     return_date = models.DateTimeField(auto_now=True, blank=True, null=True)
     payment_status = models.CharField(max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
+    #Sent by clients in the Idempotency-Key header so that a retried checkout returns the order
+    # created by the first attempt instead of creating a second one.
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    #Set when the movies of the order were put back in stock on its first return (events.py).
+    # Moving the order back to Collected doesn't reserve them again, so it stays set.
+    restocked = models.BooleanField(default=False)
 
     class Meta:
         permissions = [
             ('cancel_order', 'Can cancel order')
         ]
+        unique_together = [['customer', 'idempotency_key']]
+        #Serves a customer's orders newest first without sorting them.
+        indexes = [
+            models.Index(fields=['customer', 'rent_date'])
+        ]
+
+    #Remembering the payment status the order was loaded with, so that the signals can tell when
+    # it becomes Complete.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_payment_status = instance.__dict__.get('payment_status')
+        instance._saved_order_status = instance.__dict__.get('order_status')
+        return instance
+
+
+#Revenue of the orders rented on a day, counted once their payment is complete. Kept up to
+# date by revenue.py as payments complete, monthly and yearly figures are sums of these rows.
+class DailyRevenue(models.Model):
+    date = models.DateField(unique=True)
+    order_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    gross_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['date']
+
+
+#Users kept out of the API by BlockUserPermission. Read through the in-memory snapshot kept by
+# blocklist.py, never per request.
+class BlockedUser(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='block')
+    blocked_at = models.DateTimeField(auto_now_add=True)
+
+
+#Running totals of a customer's orders, kept up to date by history.py as orders are created,
+# returned and paid so that the history endpoint never has to add up the order history.
+class CustomerSummary(models.Model):
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    total_rentals = models.PositiveIntegerField(default=0)
+    open_rentals = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+#Daily counters behind the leaderboards (see leaderboards.py): copies of a movie rented, or
+# orders placed by a customer, on a day.
+class LeaderboardCounter(models.Model):
+    BOARD_MOVIES = 'movies'
+    BOARD_CUSTOMERS = 'customers'
+    BOARD_CHOICES = [
+        (BOARD_MOVIES, 'Movies'),
+        (BOARD_CUSTOMERS, 'Customers'),
+    ]
+
+    board = models.CharField(max_length=10, choices=BOARD_CHOICES)
+    object_id = models.CharField(max_length=20)
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['board', 'object_id', 'date']]
+        indexes = [
+            models.Index(fields=['board', 'date'])
+        ]
 
 
 class RentOrderItem(models.Model):
@@ -136,6 +233,55 @@ class RentOrderItem(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.PROTECT, related_name='rentorderitems')
     quantity = models.PositiveSmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    #Updated nightly by the compute_late_fees command while the movie hasn't been returned.
+    late_fee = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+
+#Returned and paid orders older than settings.ARCHIVE_AFTER_DAYS, moved out of RentOrder and
+# RentOrderItem by archive.py so that the tables the API and the admin work on stay small. The
+# rows keep their ids and field names, so the same lookups and serializers work on both.
+class ArchivedRentOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order_status = models.CharField(max_length=1, choices=RentOrder.ORDER_STATUS_CHOICES)
+    rent_date = models.DateTimeField()
+    return_date = models.DateTimeField(blank=True, null=True)
+    payment_status = models.CharField(max_length=1, choices=RentOrder.PAYMENT_STATUS_CHOICES)
+    customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='archivedrentorders')
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'rent_date'])
+        ]
+
+
+class ArchivedRentOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    rent_order = models.ForeignKey(ArchivedRentOrder, on_delete=models.CASCADE, related_name='items')
+    movie = models.ForeignKey(Movie, on_delete=models.PROTECT, related_name='archivedrentorderitems')
+    quantity = models.PositiveSmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    late_fee = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+
+#Events about orders, written in the same transaction as the change to the order and handled
+# afterwards by the run_outbox_worker command (see outbox.py).
+class OutboxEvent(models.Model):
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    #When the event can next be picked up: set ahead while a worker holds it and after a
+    # failure, so that it is retried later.
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processed_at', 'available_at'])
+        ]
 
 
 class Address(models.Model):
@@ -146,7 +292,10 @@ class Address(models.Model):
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
-    created_at = models.DateTimeField(auto_now_add=True)
+    #Indexed for the purge_carts command, which picks abandoned carts by age.
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    #Set while the cart's items live in the cart cache and may be newer than the CartItem rows (see carts.py).
+    cached = models.BooleanField(default=False, db_index=True)
 
 
 class CartItem(models.Model):
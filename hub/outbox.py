@@ -0,0 +1,118 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+import traceback
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F, Min
+from django.utils import timezone
+from .models import OutboxEvent
+
+
+#Transactional outbox. publish() saves an event in the transaction that changes the order, so
+# the event exists if and only if the change was committed, and the work it stands for is done
+# later by run_outbox_worker instead of inside the request.
+#A worker claims a batch of events by pushing their available_at OUTBOX_LEASE_SECONDS ahead, so
+# no lock is held while they are handled. Each event is handled in its own transaction together
+# with marking it processed, so database side effects happen once. An event whose worker died
+# is picked up again once its lease runs out, so handlers that reach outside the database
+# (notifications) must cope with seeing an event twice. Events may be handled in any order.
+#Handlers are registered with @handles in events.py.
+
+_handlers = {}
+
+
+def handles(topic):
+    def register(handler):
+        _handlers.setdefault(topic, []).append(handler)
+        return handler
+    return register
+
+
+def publish(topic, **payload):
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def pending_events():
+    return OutboxEvent.objects.filter(processed_at__isnull=True, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+
+
+def claim_events(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        event_ids = list(pending_events()
+                         .filter(available_at__lte=now)
+                         .select_for_update(skip_locked=True)
+                         .order_by('id')
+                         .values_list('id', flat=True)[:batch_size])
+        OutboxEvent.objects.filter(pk__in=event_ids).update(
+            available_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS))
+    return event_ids
+
+
+def handle_event(event_id):
+    try:
+        with transaction.atomic():
+            event = OutboxEvent.objects.select_for_update().get(pk=event_id)
+            if event.processed_at is not None:
+                return True
+            for handler in _handlers.get(event.topic, []):
+                handler(**event.payload)
+            OutboxEvent.objects.filter(pk=event_id).update(processed_at=timezone.now(), attempts=F('attempts') + 1)
+        return True
+    except Exception:
+        error = traceback.format_exc()
+        #Backing off exponentially, from 15 seconds up to 10 minutes between attempts. If even
+        # that can't be written, the event is retried once its lease runs out.
+        try:
+            event = OutboxEvent.objects.only('attempts').get(pk=event_id)
+            OutboxEvent.objects.filter(pk=event_id).update(
+                attempts=F('attempts') + 1,
+                last_error=error,
+                available_at=timezone.now() + timedelta(seconds=min(2 ** event.attempts * 15, 600)),
+            )
+        except DatabaseError:
+            pass
+        return False
+
+
+#Runs in the pool, a share of the batch per task. The connection belongs to the thread or the
+# process running the task, so it is closed once the share is done.
+def handle_events(event_ids):
+    try:
+        return [handle_event(event_id) for event_id in event_ids]
+    finally:
+        connection.close()
+
+
+def create_pool(workers, processes=False):
+    if processes:
+        #Forked processes must not share the parent's database connections.
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+#Claims and handles one batch, returning (processed, failed).
+def process_batch(pool, workers, batch_size):
+    event_ids = claim_events(batch_size)
+    if not event_ids:
+        return (0, 0)
+    shares = [event_ids[i::workers] for i in range(workers) if event_ids[i::workers]]
+    results = [ok for share in pool.map(handle_events, shares) for ok in share]
+    return (results.count(True), results.count(False))
+
+
+#Lag metrics: how many events are waiting, how long the oldest has waited in seconds, and how
+# many have used up their attempts and need looking at.
+def outbox_stats():
+    pending = pending_events()
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'pending': pending.count(),
+        'lag_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0,
+        'failed': OutboxEvent.objects.filter(processed_at__isnull=True, attempts__gte=settings.OUTBOX_MAX_ATTEMPTS).count(),
+    }
+
+
+def purge_processed(days):
+    return OutboxEvent.objects.filter(processed_at__lt=timezone.now() - timedelta(days=days)).delete()[0]
@@ -0,0 +1,159 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+#Keyset pagination classes. Instead of a COUNT(*) and an OFFSET that grows with every page,
+# the cursor stores the position of the last row that was returned and the next page is fetched
+# with a WHERE on the ordering, so page 10,000 costs the same as page 1.
+#The ordering fields (daily_rental_rate, title...) repeat, so the primary key is always added as
+# the last ordering field and the cursor holds the values of all of them. The next page starts
+# after the row (field, pk) > (last field, last pk), which never skips or repeats rows with equal
+# values. The leading field is also bounded on its own (field >= last field) so the database can
+# seek through its index.
+#The next and previous links carry an opaque base64 encoded cursor instead of a page number.
+
+class KeysetPagination(BasePagination):
+    page_size = 10
+    #Used when neither the view's OrderingFilter nor the client set an ordering.
+    ordering = '-pk'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request, queryset, view):
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return tuple(ordering)
+        return (self.ordering,) if isinstance(self.ordering, str) else tuple(self.ordering)
+
+    #(field, descending) pairs, ending with the primary key.
+    def get_keys(self, ordering):
+        keys = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        if not any(name in ('pk', 'id') for name, descending in keys):
+            keys.append(('pk', keys[0][1]))
+        return keys
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.keys = self.get_keys(self.get_ordering(request, queryset, view))
+        (position, reverse) = self.decode_cursor(request)
+
+        #A previous page is read backwards from its first row and turned around afterwards.
+        queryset = queryset.order_by(*[('-' if descending != reverse else '') + name for name, descending in self.keys])
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.after(position, reverse))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.first = self.row_position(rows[0]) if rows else None
+        self.last = self.row_position(rows[-1]) if rows else None
+        return rows
+
+    #The rows after position in the (possibly reversed) ordering.
+    def after(self, position, reverse):
+        (first_name, first_descending) = self.keys[0]
+        bound = Q(**{f'{first_name}__{"lte" if first_descending != reverse else "gte"}': position[0]})
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.keys, position):
+            condition |= equal & Q(**{f'{name}__{"lt" if descending != reverse else "gt"}': value})
+            equal &= Q(**{name: value})
+        return bound & condition
+
+    def row_position(self, row):
+        position = []
+        for name, descending in self.keys:
+            value = getattr(row, name)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            position.append(value)
+        return position
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return (None, False)
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = cursor['p'], bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        #A cursor handed out for another ordering.
+        if not isinstance(position, list) or len(position) != len(self.keys):
+            raise NotFound(self.invalid_cursor_message)
+        return (position, reverse)
+
+    def make_cursor(self, position, reverse):
+        return urlsafe_b64encode(json.dumps({'p': position, 'r': int(reverse)}).encode()).decode('ascii')
+
+    def encode_cursor(self, position, reverse):
+        return replace_query_param(self.base_url, self.cursor_query_param, self.make_cursor(position, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last, False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first, True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class MovieCursorPagination(KeysetPagination):
+    #Used when the client does not pass ?ordering=. When the client does, the OrderingFilter
+    # on the view decides the ordering and the cursor is built from that field instead.
+    ordering = 'title'
+
+    #Search results are ranked best match first unless the client asks for another ordering.
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get('ordering'):
+            return ('-search_rank',)
+        return super().get_ordering(request, queryset, view)
+
+
+class RentOrderCursorPagination(KeysetPagination):
+    #Newest orders first, backed by the index on rent_date.
+    ordering = '-rent_date'
@@ -1,28 +1,34 @@
 from rest_framework.permissions import SAFE_METHODS
 from rest_framework.permissions import BasePermission, DjangoModelPermissions
+from .blocklist import is_blocked
 
 #Create a permission that allows us to block users. 
 #Since this is a permission that would be a custom one and is an object related permission,
 #we would need to extend the base permission class.
 
 
+#Lets everyone through except blocked users, unless they may block users themselves. Whether a
+# user is blocked is looked up in the in-memory blocklist (blocklist.py), without a query.
 class BlockUserPermission(BasePermission):
-    blocked_users_id = []
-
     def has_permission(self, request, view):
         #Getting the current user
         user = request.user
-        if request.user.has_perm('hub.block_user'):
-            return request.user.has_perm('hub.block_user')
-        elif user.is_authenticated and user.id in self.blocked_users_id:
-            return False
-    
+        if not user.is_authenticated or not is_blocked(user.id):
+            return True
+        return user.has_perm('hub.block_user')
+
+
+class CanBlockUserPermission(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.has_perm('hub.block_user')
+
+
 
 class IsAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
             return True
-        return bool(request.user and request.is_staff)
+        return bool(request.user and request.user.is_staff)
     
 
 class ViewCustomerHistoryPermission(BasePermission):
@@ -0,0 +1,45 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+
+
+#All the price arithmetic of the shop in one place. Every function takes a whole list of objects
+# (a page of movies, the items of a cart, the lines of a quote) and prices them in a single pass,
+# using Decimal end to end and rounding only the final amounts to cents.
+
+CENT = Decimal('0.01')
+
+
+def get_tax_rate():
+    #Read through str() so that a float in the settings never becomes an inexact Decimal.
+    return Decimal(str(settings.RENTAL_TAX_RATE))
+
+
+def round_price(amount):
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def prices_with_tax(rates):
+    multiplier = 1 + get_tax_rate()
+    return [round_price(rate * multiplier) for rate in rates]
+
+
+#lines are (quantity, daily_rental_rate) pairs, days the number of days the movies are rented for.
+def line_totals(lines, days=1):
+    return [round_price(quantity * rate * days) for quantity, rate in lines]
+
+
+def order_total(lines, days=1):
+    return sum(line_totals(lines, days), Decimal('0.00'))
+
+
+#Quote for renting several movies for a number of days, before and after tax.
+def rental_quote(lines, days):
+    totals = line_totals(lines, days)
+    subtotal = sum(totals, Decimal('0.00'))
+    tax = round_price(subtotal * get_tax_rate())
+    return {
+        'line_totals': totals,
+        'subtotal': subtotal,
+        'tax': tax,
+        'total': subtotal + tax,
+    }
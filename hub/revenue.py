@@ -0,0 +1,51 @@
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import TruncMonth, TruncYear
+from django.utils import timezone
+from .models import DailyRevenue, RentOrder, RentOrderItem
+
+
+#Revenue rollups. Each order is added to the DailyRevenue row of the day it was rented when its
+# payment becomes Complete, and taken off again if it stops being Complete, so the rollup
+# never has to go through the order history. Monthly and yearly figures are derived from the
+# daily rows.
+
+LINE_TOTAL = F('quantity') * F('unit_price')
+
+
+def order_totals(order_id):
+    return RentOrderItem.objects.filter(rent_order_id=order_id).aggregate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum(LINE_TOTAL, output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+
+
+#sign is 1 when the order's payment completes and -1 when it is reverted. Returns the order's
+# totals.
+def record_order_revenue(order: RentOrder, sign=1):
+    totals = order_totals(order.pk)
+    day = timezone.localtime(order.rent_date).date()
+    DailyRevenue.objects.get_or_create(date=day)
+    DailyRevenue.objects.filter(date=day).update(
+        order_count=F('order_count') + sign,
+        quantity=F('quantity') + sign * (totals['total_quantity'] or 0),
+        gross_revenue=F('gross_revenue') + sign * (totals['total_revenue'] or 0),
+    )
+    return totals
+
+
+def get_revenue(period='day', start=None, end=None):
+    rows = DailyRevenue.objects.all()
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    if period == 'day':
+        return list(rows.values('date', 'order_count', 'quantity', 'gross_revenue'))
+
+    truncate = TruncMonth if period == 'month' else TruncYear
+    return list(rows
+                .annotate(period=truncate('date'))
+                .values('period')
+                .annotate(order_count=Sum('order_count'), quantity=Sum('quantity'), gross_revenue=Sum('gross_revenue'))
+                .values('period', 'order_count', 'quantity', 'gross_revenue')
+                .order_by('period'))
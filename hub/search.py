@@ -0,0 +1,75 @@
+import re
+from collections import Counter
+from django.db.models import OuterRef, Q, Subquery, Sum
+from rest_framework.filters import BaseFilterBackend
+from .models import Movie, SearchTerm
+
+
+#Weights of the fields a term can be found in. A match in the title ranks higher than a match
+# in a genre, which ranks higher than one in the description.
+TITLE_WEIGHT = 10
+GENRE_WEIGHT = 5
+DESCRIPTION_WEIGHT = 1
+
+TERM_MAX_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return [token[:TERM_MAX_LENGTH] for token in TOKEN_PATTERN.findall(str(text).lower())]
+
+
+def build_terms(movie: Movie, genre_titles):
+    weights = Counter()
+    for token in tokenize(movie.title):
+        weights[token] += TITLE_WEIGHT
+    for title in genre_titles:
+        for token in tokenize(title):
+            weights[token] += GENRE_WEIGHT
+    for token in tokenize(movie.description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return [SearchTerm(term=term, movie_id=movie.pk, weight=weight) for term, weight in weights.items()]
+
+
+#Replaces the index rows of the given movies. Used incrementally by the signals and in bulk by
+# the rebuild_search_index command.
+def index_movies(movie_ids):
+    movie_ids = list(movie_ids)
+    if not movie_ids:
+        return
+    movies = Movie.objects.filter(pk__in=movie_ids).only('id', 'title', 'description').prefetch_related('genres')
+    terms = []
+    for movie in movies:
+        terms += build_terms(movie, [genre.title for genre in movie.genres.all()])
+    SearchTerm.objects.filter(movie_id__in=movie_ids).delete()
+    SearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+
+#Drop-in replacement for rest_framework's SearchFilter on the movie endpoint. Every word in
+# ?search= is matched as a prefix against the inverted index, a movie has to match all of them,
+# and results are annotated with search_rank (the sum of the weights of the matching terms).
+#Unlike the icontains lookups through the genres table this never returns duplicate rows.
+class MovieSearchFilter(BaseFilterBackend):
+    search_param = 'search'
+
+    def get_search_terms(self, request):
+        return tokenize(request.query_params.get(self.search_param, ''))
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        any_term = Q()
+        for term in search_terms:
+            #Each word narrows the result using the term index only.
+            queryset = queryset.filter(pk__in=SearchTerm.objects.filter(term__startswith=term).values('movie_id'))
+            any_term |= Q(term__startswith=term)
+
+        rank = (SearchTerm.objects
+                .filter(any_term, movie_id=OuterRef('pk'))
+                .values('movie_id')
+                .annotate(rank=Sum('weight'))
+                .values('rank'))
+        return queryset.annotate(search_rank=Subquery(rank))
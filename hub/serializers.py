@@ -1,43 +1,59 @@
 #Model to convert python objects to dictionaries so that we can pass it to the views to handle requests 
 #and convert these dictionaries to JSON.
 
-from decimal import Decimal
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Cart, CartItem, Customer, Genre, Movie, RentOrder, RentOrderItem, Review 
+from .carts import UnknownMovie, get_cart_store
+from .customers import get_customer_id
+from .inventory import InsufficientInventory, reserve_inventory
+from .models import Cart, CartItem, Customer, CustomerSummary, Genre, Movie, RentOrder, RentOrderItem, Review 
+from .pricing import prices_with_tax, rental_quote
 from rest_framework import serializers
 
 
+#Number of movie titles listed with each genre. The full list of a genre's movies is
+# available, paginated, from hub/movies/?genres=<id>.
+GENRE_MOVIE_PREVIEW_SIZE = 10
+
+
 #class to convert the list of genres into dictionary objects
 class GenreSerializer(serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = ['id', 'title', 'movie', 'movie_count']
-        #Using the read only attribute makes it possible for the reverse relationship not
-        # to run into an error when trying to write to the field which was annotated.
-    movie_count = serializers.IntegerField(read_only=True)
-    
-    # def movie_id(self):
-    #     movie_id = self.context.get('movie_id')
-    #     return movie_id
-    movie = serializers.StringRelatedField(many=True)
-    
+        #movie_count is a column kept up to date by signals, so it is read only.
+        read_only_fields = ['movie_count']
 
-    #I may need to change how we pass information to the movie serializer by
-    # updating the field using a ListField instead. I should attempt to achieve this when I 
-    # have learned how to dynamically extract the queryset from a view using a serializer context instead of just 
-    # querying all the movies one by one which is going to affect the performance of the code.
-    #movie = serializers.ListField(child=serializers.PrimaryKeyRelatedField(queryset=Genre.objects.filter(movie__id=movie_id), many=True), allow_empty=False)
+    movie = serializers.SerializerMethodField(method_name='get_movie_preview')
 
-    
-    # movies = serializers.SerializerMethodField(method_name='get_movies')
+    #Titles of the first few movies of the genre. GenreViewSet prefetches them into
+    # movie_preview with a sliced Prefetch, so listing genres never loads the whole catalog.
+    def get_movie_preview(self, genre: Genre):
+        if hasattr(genre, 'movie_preview'):
+            movies = genre.movie_preview
+        else:
+            movies = genre.movie.only('id', 'title')[:GENRE_MOVIE_PREVIEW_SIZE]
+        return [str(movie) for movie in movies]
 
-    # def get_movies(self, obj):
-    #     return ", ".join([movie.title for movie in obj.movie_genres.all()])
 
+#Genre representation used when genres are nested in a movie. It only reads columns of the
+# genres loaded by prefetch_related('genres'), so it doesn't run any query of its own.
+class SimpleGenreSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Genre
+        fields = ['id', 'title']
 
-    
 
+#Prices a whole page of movies at once and hands the results to MovieSerializer.calculate_tax
+# through the context, instead of pricing the movies one at a time.
+class MovieListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        movies = list(data.all() if hasattr(data, 'all') else data)
+        #The field may have been left out with ?fields= or ?exclude=.
+        if 'price_with_tax' in self.child.fields:
+            prices = prices_with_tax([movie.daily_rental_rate for movie in movies])
+            self.context['prices_with_tax'] = {movie.pk: price for movie, price in zip(movies, prices)}
+        return super().to_representation(movies)
 
 
 #Class to convert the list of movies to dictionary objects
@@ -45,11 +61,12 @@ class MovieSerializer(serializers.ModelSerializer):
     class Meta:
         model = Movie
         fields = ['id', 'title', 'daily_rental_rate', 'inventory','age_rating', 'price_with_tax', 'genres']
+        list_serializer_class = MovieListSerializer
 
     
     #genres = serializers.SerializerMethodField(method_name='get_genres_title')
     price_with_tax = serializers.SerializerMethodField(method_name='calculate_tax')
-    genres = GenreSerializer(many=True)
+    genres = SimpleGenreSerializer(many=True)
 
     #Providing a string representation of the related genres field, rendering each genre in a 
     #string format.
@@ -62,7 +79,10 @@ class MovieSerializer(serializers.ModelSerializer):
     #Serializer method to calulate tax. We include this in the fields list because django looks 
     # at the fields in the serializer class before looking at the fields in the models.
     def calculate_tax(self, movie: Movie):
-        return movie.daily_rental_rate * Decimal(1.1)
+        prices = self.context.get('prices_with_tax', {})
+        if movie.pk in prices:
+            return prices[movie.pk]
+        return prices_with_tax([movie.daily_rental_rate])[0]
     
 #Serializer class to pass in the cartitem class as an object. Getting only the necessary fields
 # that we require. 
@@ -80,10 +100,8 @@ class CartItemSerializer(serializers.ModelSerializer):
     movie = SimpleMovieSerializer()
     cart = serializers.PrimaryKeyRelatedField(read_only=True)
 
-    total_price = serializers.SerializerMethodField(method_name='get_total_price')
-
-    def get_total_price(self, cartitem: CartItem):
-        return cartitem.movie.daily_rental_rate * cartitem.quantity
+    #Computed by the cart store, in SQL for the database store (see carts.py).
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
 
 
@@ -94,14 +112,10 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ['id', 'items', 'total_price']
 
-    def get_total_price(self, cart: Cart):
-           #Accessing the related child using a list comprehension and storing it in
-           # the item variable so that we can perform actions on individual fields. 
-           return sum([item.quantity * item.movie.daily_rental_rate for item in cart.items.all()])
-
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.SerializerMethodField(method_name='get_total_price')
+    #Computed by the cart store, in SQL for the database store (see carts.py).
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     
 
@@ -109,6 +123,47 @@ class CartSerializer(serializers.ModelSerializer):
 
 
 
+#A movie and how many copies of it, used by quotes and by adding several items to a cart at once.
+class MovieQuantitySerializer(serializers.Serializer):
+    movie_id = serializers.CharField(max_length=5)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+#Serializer for quoting the price of renting movies for a number of days.
+class RentalQuoteSerializer(serializers.Serializer):
+    items = MovieQuantitySerializer(many=True, allow_empty=False)
+    days = serializers.IntegerField(min_value=1)
+
+    def validate_items(self, items):
+        movie_ids = {item['movie_id'] for item in items}
+        #One query for all the movies of the quote.
+        self.movies = Movie.objects.only('id', 'title', 'daily_rental_rate').in_bulk(movie_ids)
+        missing = movie_ids - set(self.movies)
+        if missing:
+            raise serializers.ValidationError(f'No movie with the id {", ".join(sorted(missing))} exists.')
+        return items
+
+    def quote(self):
+        items = self.validated_data['items']
+        days = self.validated_data['days']
+        lines = [(item['quantity'], self.movies[item['movie_id']].daily_rental_rate) for item in items]
+        quote = rental_quote(lines, days)
+        return {
+            'days': days,
+            'items': [
+                {
+                    'movie': SimpleMovieSerializer(self.movies[item['movie_id']]).data,
+                    'quantity': item['quantity'],
+                    'total_price': total,
+                }
+                for item, total in zip(items, quote['line_totals'])
+            ],
+            'subtotal': quote['subtotal'],
+            'tax': quote['tax'],
+            'total': quote['total'],
+        }
+
+
 #Serializer class to convert the list of reviews to dictionary objects
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
@@ -125,16 +180,8 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 #Class created specifically for adding items to a cart
 class AddCartItemSerializer(serializers.ModelSerializer):
-    movie_id = serializers.IntegerField()
-
-    #Function for validating the movie_id passed into the cart
-    def validate_movie_id(self, value):
-        #checking to see if it exists
-        if not Movie.objects.filter(pk=value).exists():
-            raise serializers.ValidationError('No movie with the id exists.')
-        return value
-
-
+    #Movie ids are strings, the primary key of Movie is a CharField.
+    movie_id = serializers.CharField(max_length=5)
 
     class Meta:
         model = CartItem
@@ -148,18 +195,26 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         movie_id = self.validated_data['movie_id']
         quantity = self.validated_data['quantity']
 
+        #The store adds to the quantity of the item if the movie is already in the cart, in one
+        # statement, and reports movies that don't exist instead of them being checked first.
         try:
-            #Updating the quantity of the cart item if it exists
-            cart_item = CartItem.objects.get(cart_id=cart_id, movie_id=movie_id)
-            if cart_item is not None:
-                cart_item.quantity += quantity
-                cart_item.save()
-                self.instance = cart_item
-        except CartItem.DoesNotExist:
-            #Creating the cart item since it does not exist.
-            self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
-        
+            self.instance = get_cart_store().add_item(cart_id, movie_id, quantity)
+        except UnknownMovie:
+            raise serializers.ValidationError({'movie_id': 'No movie with the id exists.'})
         return self.instance
+
+
+#Adding several movies to a cart in one request and one transaction.
+#POST hub/carts/<id>/items/batch/ with {"items": [{"movie_id": "1", "quantity": 2}, ...]}
+class AddCartItemsSerializer(serializers.Serializer):
+    items = MovieQuantitySerializer(many=True, allow_empty=False)
+
+    def save(self, **kwargs):
+        lines = [(item['movie_id'], item['quantity']) for item in self.validated_data['items']]
+        try:
+            return get_cart_store().add_items(self.context['cart_id'], lines)
+        except UnknownMovie as error:
+            raise serializers.ValidationError({'items': str(error)})
     
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
@@ -168,6 +223,9 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['quantity']
 
+    def update(self, instance, validated_data):
+        return get_cart_store().update_item(instance.cart_id, instance.pk, validated_data['quantity'])
+
 
 class CustomerSerializer(serializers.ModelSerializer):
     #Set to readonly because we do not want clashes with someone else's account
@@ -185,12 +243,12 @@ class RentOrderItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = RentOrderItem
-        fields = ['id', 'movie', 'unit_price', 'quantity']
+        fields = ['id', 'movie', 'unit_price', 'quantity', 'late_fee']
 
         
 
 class RentOrderSerializer(serializers.ModelSerializer):
-    customer = serializers.IntegerField()
+    customer = serializers.IntegerField(source='customer_id', read_only=True)
 
     items = RentOrderItemSerializer(many=True)
 
@@ -209,26 +267,101 @@ class CreateRentOrderSerializer(serializers.Serializer):
 
     #overriding the way that this serializer is saved because we want to 
     #input the cart id and go ahead to dellete that cart.
+    #Sets self.created to False when the order already existed for the idempotency key.
     def save(self, **kwargs):
+        cart_id = self.validated_data['cart_id']
+        #getting the user id and the idempotency key from the context.
+        user_id = self.context['user_id']
+        idempotency_key = self.context.get('idempotency_key')
+        #getting the current customer.
+        customer = Customer(id=get_customer_id(user_id), user_id=user_id)
+
+        self.created = False
+        if idempotency_key:
+            order = RentOrder.objects.filter(customer=customer, idempotency_key=idempotency_key).first()
+            if order is not None:
+                return order
+
+        try:
+            order = self.checkout(customer, cart_id, idempotency_key)
+        except IntegrityError:
+            #A concurrent retry with the same key got there first, its order is the answer. Any
+            # other integrity error is not about the key and goes up as it is.
+            order = None
+            if idempotency_key:
+                order = RentOrder.objects.filter(customer=customer, idempotency_key=idempotency_key).first()
+            if order is None:
+                raise
+            return order
+        self.created = True
+        return order
+
+    #The checkout runs a fixed set of statements whatever the size of the cart: lock the cart,
+    # read its lines with their prices, insert the order, bulk insert the order items, take the
+    # movies out of stock with one UPDATE (see inventory.py) and delete the cart.
+    def checkout(self, customer, cart_id, idempotency_key):
+        cart_store = get_cart_store()
         with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-            #getting the user id from the context.
-            user_id = self.context['user_id']
-            #getting the current customer.
-            (customer_id, created) = Customer.objects.get_or_create(customer_id=user_id)
+            #Locking the cart so two checkouts of the same cart can't both turn it into an order.
+            if not Cart.objects.select_for_update().filter(pk=cart_id).exists():
+                raise serializers.ValidationError({'cart_id': 'No cart with the id exists.'})
+            lines = cart_store.get_checkout_lines(cart_id)
+            if not lines:
+                raise serializers.ValidationError({'cart_id': 'The cart is empty.'})
+
             #Creating the rentorder for the particular customer
-            order = RentOrder.objects.create(customer_id=customer_id)
-
-            #getting the cartitems for a particular cart.
-            cart_item = CartItem.objects.select_related('movie').filter(cart_id=cart_id)
-
-            #converting a cart item into an order item by placing the values 
-            #of the cartitem into the orderitem using a list comprehension
-            rentorder_items = [RentOrderItem(
-                order=order,
-                movie=item.movie,
-                unit_price=item.movie.unit_price,
-                quantity=item.quantity,
-                ) for item in cart_item]
-            RentOrderItem.objects.bulk_create(rentorder_items)
-            Cart.objects.filter(pk=cart_id).delete()
\ No newline at end of file
+            order = RentOrder.objects.create(customer=customer, idempotency_key=idempotency_key)
+
+            #converting the cart lines into order items, the price being the daily rental rate
+            # of the movie at the time of the checkout.
+            RentOrderItem.objects.bulk_create([RentOrderItem(
+                rent_order=order,
+                movie_id=movie_id,
+                unit_price=daily_rental_rate,
+                quantity=quantity,
+                ) for movie_id, quantity, daily_rental_rate in lines])
+
+            #Taking the movies out of stock last, so the movie rows stay locked for as short a time as possible.
+            # If a movie ran out, the whole checkout is rolled back.
+            try:
+                reserve_inventory([(movie_id, quantity) for movie_id, quantity, daily_rental_rate in lines])
+            except InsufficientInventory as error:
+                raise serializers.ValidationError({'cart_id': str(error)})
+
+            cart_store.delete_cart(cart_id)
+            #The leaderboards are updated by the outbox worker from the order.created event.
+            return order
+
+
+
+class RevenueQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=['day', 'month', 'year'], default='day')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+
+class CustomerSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CustomerSummary
+        fields = ['total_rentals', 'open_rentals', 'total_spent']
+
+
+class HistoryQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+
+#output is not called format, which the REST framework keeps for choosing a renderer.
+class ExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+
+class OrderExportQuerySerializer(ExportQuerySerializer):
+    order_status = serializers.ChoiceField(choices=RentOrder.ORDER_STATUS_CHOICES, required=False)
+    payment_status = serializers.ChoiceField(choices=RentOrder.PAYMENT_STATUS_CHOICES, required=False)
+
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    window = serializers.ChoiceField(choices=['week', 'month', 'all'], default='all')
@@ -0,0 +1,168 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.db import transaction
+from django.dispatch import receiver
+from .caching import bump_catalog_version
+from django.core.cache import cache
+from .customers import customer_id_key
+from .genres import adjust_movie_counts
+from .history import adjust_summary
+from .models import Customer, Genre, Movie, RentOrder
+from .outbox import publish
+from .search import index_movies
+
+
+#Keeping the search index up to date. Any change to a movie's title, description or genres
+# re-indexes only the movies affected by that change.
+
+#Saves that only touch the inventory, the price... leave the index alone. A field that was
+# deferred when the movie was loaded and never set isn't in __dict__, so it didn't change either.
+@receiver(post_save, sender=Movie)
+def index_saved_movie(sender, instance, created, **kwargs):
+    saved = getattr(instance, '_saved_search_fields', None)
+    current = {name: instance.__dict__.get(name) for name in Movie.SEARCH_FIELDS}
+    changed = created or saved is None or any(
+        value is not None and value != saved[name] for name, value in current.items())
+    if changed:
+        index_movies([instance.pk])
+    instance._saved_search_fields = {name: current[name] if current[name] is not None else (saved or {}).get(name)
+                                     for name in Movie.SEARCH_FIELDS}
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def index_movie_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    #When the relationship is changed from the genre side (genre.movie.add(...)), the instance
+    # is the genre and pk_set holds the movie ids.
+    if not reverse:
+        movie_ids = [instance.pk]
+    elif action == 'pre_clear':
+        #pk_set is empty for a clear, so remember the movies before they are removed.
+        instance._search_movie_ids = list(instance.movie.values_list('pk', flat=True))
+        return
+    elif action == 'post_clear':
+        movie_ids = getattr(instance, '_search_movie_ids', [])
+    else:
+        movie_ids = pk_set or []
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        index_movies(movie_ids)
+
+
+@receiver(post_save, sender=Genre)
+def index_renamed_genre(sender, instance, created, **kwargs):
+    if not created:
+        index_movies(instance.movie.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Genre)
+def remember_genre_movies(sender, instance, **kwargs):
+    instance._search_movie_ids = list(instance.movie.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+def index_deleted_genre(sender, instance, **kwargs):
+    index_movies(getattr(instance, '_search_movie_ids', []))
+
+
+
+#Invalidating the catalog response cache. The version is bumped after the transaction commits so
+# that a request running in between can't cache the old data under the new version.
+
+@receiver(post_save, sender=Movie)
+def invalidate_catalog_on_movie_change(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_catalog_version(instance.last_updated))
+
+
+#The deleted movie's last_updated is older than the change, which happens now.
+@receiver(post_delete, sender=Movie)
+def invalidate_catalog_on_movie_delete(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_catalog_on_genre_change(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def invalidate_catalog_on_movie_genres_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_catalog_version)
+
+
+
+#Keeping Genre.movie_count up to date. remove() reports the ids it was given even when they
+# weren't linked, so the links that really exist are looked up before they are removed.
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def count_movie_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    links = Movie.genres.through.objects
+    if action == 'post_add':
+        if reverse:
+            adjust_movie_counts([instance.pk], len(pk_set))
+        else:
+            adjust_movie_counts(pk_set, 1)
+    elif action == 'pre_remove':
+        if reverse:
+            instance._removed_movie_count = links.filter(genre_id=instance.pk, movie_id__in=pk_set).count()
+        else:
+            instance._removed_genre_ids = list(links.filter(movie_id=instance.pk, genre_id__in=pk_set).values_list('genre_id', flat=True))
+    elif action == 'post_remove':
+        if reverse:
+            adjust_movie_counts([instance.pk], -getattr(instance, '_removed_movie_count', 0))
+        else:
+            adjust_movie_counts(getattr(instance, '_removed_genre_ids', []), -1)
+    elif action == 'pre_clear' and not reverse:
+        instance._removed_genre_ids = list(instance.genres.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        if reverse:
+            Genre.objects.filter(pk=instance.pk).update(movie_count=0)
+        else:
+            adjust_movie_counts(getattr(instance, '_removed_genre_ids', []), -1)
+
+
+#Deleting a movie removes its genre links through the cascade, which doesn't send m2m_changed.
+@receiver(pre_delete, sender=Movie)
+def remember_movie_genres(sender, instance, **kwargs):
+    instance._deleted_genre_ids = list(instance.genres.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Movie)
+def count_deleted_movie(sender, instance, **kwargs):
+    adjust_movie_counts(getattr(instance, '_deleted_genre_ids', []), -1)
+
+
+
+@receiver(post_delete, sender=Customer)
+def forget_customer_id(sender, instance, **kwargs):
+    cache.delete(customer_id_key(instance.user_id))
+
+
+
+#Publishing the order's events in the transaction that saves it, see events.py for what is done
+# with them. The revenue rollups and the customer's total spent follow the payment becoming
+# Complete, or stopping being Complete, the stock follows the movies being returned.
+@receiver(post_save, sender=RentOrder)
+def publish_order_events(sender, instance, created, **kwargs):
+    if created:
+        publish('order.created', order_id=instance.pk)
+
+    was_complete = not created and getattr(instance, '_saved_payment_status', None) == RentOrder.PAYMENT_STATUS_COMPLETE
+    is_complete = instance.payment_status == RentOrder.PAYMENT_STATUS_COMPLETE
+    if is_complete != was_complete:
+        publish('order.payment_changed', order_id=instance.pk, sign=1 if is_complete else -1)
+    instance._saved_payment_status = instance.payment_status
+
+    was_open = not created and getattr(instance, '_saved_order_status', None) == RentOrder.ORDER_STATUS_COLLECTED
+    is_open = instance.order_status == RentOrder.ORDER_STATUS_COLLECTED
+    if was_open and instance.order_status == RentOrder.ORDER_STATUS_RETURNED:
+        publish('order.returned', order_id=instance.pk)
+    #Counting the customer's rentals, and the ones not yet returned.
+    adjust_summary(instance.customer_id, rentals=1 if created else 0, open_rentals=int(is_open) - int(was_open))
+    instance._saved_order_status = instance.order_status
+
+
+@receiver(post_delete, sender=RentOrder)
+def uncount_customer_rentals(sender, instance, **kwargs):
+    is_open = instance.order_status == RentOrder.ORDER_STATUS_COLLECTED
+    adjust_summary(instance.customer_id, rentals=-1, open_rentals=-int(is_open))
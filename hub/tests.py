@@ -1,3 +1,410 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .archive import archive_batch
+from .caching import get_catalog_state
+from .carts import CacheCartStore
+from .exports import movie_rows, order_rows
+from .latefees import update_late_fees
+from .inventory import reserve_inventory
+from .leaderboards import get_leaderboard, increment
+from .models import Cart, CartItem, Customer, Genre, LeaderboardCounter, Movie, OutboxEvent, RentOrder, RentOrderItem
+from .outbox import handle_event
 
 # Create your tests here.
+
+
+def create_movies(count, rate=Decimal('2.00'), start=0, inventory=1, **fields):
+    return Movie.objects.bulk_create([
+        Movie(id=f'{start + i:05d}', title=f'Movie {start + i}', description='', daily_rental_rate=rate, inventory=inventory, **fields)
+        for i in range(count)
+    ])
+
+
+#Follows the next (or previous) links from url and returns the ids seen, in order.
+def walk(client, url, link='next'):
+    seen = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200, response.data
+        seen += [row['id'] for row in response.data['results']]
+        url = response.data[link]
+    return seen
+
+
+class MoviePaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_equal_ordering_values_are_neither_skipped_nor_repeated(self):
+        create_movies(35)
+        create_movies(5, rate=Decimal('1.00'), start=35)
+        expected = list(Movie.objects.order_by('daily_rental_rate', 'pk').values_list('pk', flat=True))
+
+        seen = walk(self.client, '/hub/movies/?ordering=daily_rental_rate')
+        self.assertEqual(seen, expected)
+
+        seen = walk(self.client, '/hub/movies/?ordering=-daily_rental_rate')
+        self.assertEqual(seen, expected[::-1])
+
+    def test_previous_links_walk_back_to_the_first_page(self):
+        create_movies(25)
+        url = '/hub/movies/?ordering=daily_rental_rate'
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append([row['id'] for row in response.data['results']])
+            last = response
+            url = response.data['next']
+
+        url = last.data['previous']
+        for page in reversed(pages[:-1]):
+            response = self.client.get(url)
+            self.assertEqual([row['id'] for row in response.data['results']], page)
+            url = response.data['previous']
+        self.assertIsNone(url)
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get('/hub/movies/?cursor=nonsense').status_code, 404)
+
+
+class MovieSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_equal_ranks_are_neither_skipped_nor_repeated(self):
+        for movie in create_movies(25):
+            movie.title = 'Naruto'
+            movie.save()
+        seen = walk(self.client, '/hub/movies/?search=nar')
+        self.assertEqual(sorted(seen), sorted(Movie.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(seen), 25)
+
+    def test_only_searchable_changes_reindex(self):
+        (movie,) = create_movies(1)
+        movie = Movie.objects.get(pk=movie.pk)
+        movie.inventory = 5
+        with self.assertNumQueries(1):
+            movie.save()
+
+        movie.title = 'Akira'
+        movie.save()
+        self.assertEqual([row['id'] for row in self.client.get('/hub/movies/?search=akira').data['results']], [movie.pk])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_deleting_a_movie_moves_last_modified_forward(self):
+        (old, new) = create_movies(2)
+        Movie.objects.filter(pk=old.pk).update(last_updated=timezone.now() - timedelta(days=40))
+        Movie.objects.filter(pk=new.pk).update(last_updated=timezone.now() - timedelta(days=30))
+        last_modified = self.client.get('/hub/movies/')['Last-Modified']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.get(pk=old.pk).delete()
+        response = self.client.get('/hub/movies/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [new.pk])
+
+
+#Returns and pays for the count oldest orders, backdates them and moves them to the archive.
+def archive_oldest_orders(count):
+    order_ids = list(RentOrder.objects.order_by('pk').values_list('pk', flat=True)[:count])
+    RentOrder.objects.filter(pk__in=order_ids).update(
+        order_status=RentOrder.ORDER_STATUS_RETURNED, payment_status=RentOrder.PAYMENT_STATUS_COMPLETE,
+        rent_date=timezone.now() - timedelta(days=400))
+    return archive_batch()
+
+
+class QueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_catalog(self, movies, genres_per_movie):
+        genres = Genre.objects.bulk_create([Genre(title=f'Genre {i}') for i in range(genres_per_movie)])
+        created = create_movies(movies, start=Movie.objects.count())
+        Movie.genres.through.objects.bulk_create([
+            Movie.genres.through(movie_id=movie.pk, genre_id=genre.pk) for movie in created for genre in genres])
+
+    def assertGetQueries(self, url, count, client=None):
+        #A cold response cache, so the list is read from the database every time.
+        cache.clear()
+        with self.assertNumQueries(count):
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    #The catalog state for the ETag, the page of movies and their genres.
+    def test_movie_list_queries_do_not_grow_with_page_or_genres(self):
+        self.create_catalog(movies=1, genres_per_movie=1)
+        self.assertGetQueries('/hub/movies/', 3)
+
+    def test_movie_list_queries_with_a_full_page_and_many_genres(self):
+        self.create_catalog(movies=25, genres_per_movie=8)
+        self.assertGetQueries('/hub/movies/', 3)
+        self.assertGetQueries('/hub/movies/?ordering=-daily_rental_rate', 3)
+
+    def test_movie_detail_queries(self):
+        self.create_catalog(movies=1, genres_per_movie=8)
+        self.assertGetQueries('/hub/movies/00000/', 3)
+
+    #The catalog state, the COUNT(*) of the page number pagination, the genres and their movie
+    # previews.
+    def test_genre_list_queries_do_not_grow_with_movies(self):
+        self.create_catalog(movies=1, genres_per_movie=1)
+        self.assertGetQueries('/hub/genres/', 4)
+        self.create_catalog(movies=30, genres_per_movie=12)
+        self.assertGetQueries('/hub/genres/', 4)
+
+
+    def create_orders(self, customer, orders, movies_per_order):
+        movies = create_movies(movies_per_order, start=Movie.objects.count())
+        created = RentOrder.objects.bulk_create([RentOrder(customer=customer) for i in range(orders)])
+        RentOrderItem.objects.bulk_create([
+            RentOrderItem(rent_order=order, movie=movie, quantity=1, unit_price=movie.daily_rental_rate)
+            for order in created for movie in movies])
+
+    def create_order_clients(self):
+        User = get_user_model()
+        staff = APIClient()
+        staff.force_authenticate(User.objects.create_user('staff', 'staff@example.com', 'secret', is_staff=True))
+        user = User.objects.create_user('customer', 'customer@example.com', 'secret')
+        customer = APIClient()
+        customer.force_authenticate(user)
+        return (staff, customer, Customer.objects.create(user=user))
+
+    #Staff: the page of orders and their items with their movies, read from the hot and the archive
+    # table (a table without orders has no items to read). A customer also looks up their customer
+    # id, which is cached afterwards.
+    def test_rent_order_list_queries_do_not_grow_with_page_or_items(self):
+        (staff, customer, customer_row) = self.create_order_clients()
+        self.create_orders(customer_row, orders=1, movies_per_order=1)
+        self.assertGetQueries('/hub/rentorders/', 3, client=staff)
+        self.assertGetQueries('/hub/rentorders/', 4, client=customer)
+
+        self.create_orders(customer_row, orders=30, movies_per_order=6)
+        archive_oldest_orders(10)
+        response = self.assertGetQueries('/hub/rentorders/', 4, client=staff)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertGetQueries(response.data['next'], 4, client=staff)
+        self.assertGetQueries('/hub/rentorders/', 5, client=customer)
+        self.assertGetQueries('/hub/rentorders/?fields=id,rent_date', 2, client=staff)
+
+
+class StockCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_checkouts_keep_the_catalog_cache_and_show_current_stock(self):
+        create_movies(3)
+        first = self.client.get('/hub/movies/')
+        version = get_catalog_state()['version']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_inventory([('00001', 1)])
+        self.assertEqual(get_catalog_state()['version'], version)
+
+        #Only the stock of the movie that was reserved is read again.
+        with self.assertNumQueries(1):
+            response = self.client.get('/hub/movies/')
+        self.assertEqual({row['id']: row['inventory'] for row in response.data['results']},
+                         {'00000': 1, '00001': 0, '00002': 1})
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/hub/movies/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_stock_filters_are_not_cached(self):
+        create_movies(2)
+        self.assertEqual(len(self.client.get('/hub/movies/?inventory__gt=0').data['results']), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_inventory([('00001', 1)])
+        self.assertEqual([row['id'] for row in self.client.get('/hub/movies/?inventory__gt=0').data['results']], ['00000'])
+
+
+    def test_fieldsets_showing_stock_keep_the_id(self):
+        create_movies(2)
+        for url in ['/hub/movies/?fields=title,inventory', '/hub/movies/?exclude=id']:
+            self.client.get(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                reserve_inventory([('00001', 1)])
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual({row['id']: row['inventory'] for row in response.data['results']}, {'00000': 1, '00001': 0})
+            Movie.objects.filter(pk='00001').update(inventory=1)
+        response = self.client.get('/hub/movies/00001/?fields=inventory')
+        self.assertEqual(response.data, {'id': '00001', 'inventory': 1})
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user('customer', 'customer@example.com', 'secret'))
+        create_movies(6, inventory=3)
+
+    def checkout(self, movies, quantity=1):
+        cart = Cart.objects.create()
+        CartItem.objects.bulk_create([CartItem(cart=cart, movie_id=f'{i:05d}', quantity=quantity) for i in range(movies)])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/hub/rentorders/', {'cart_id': str(cart.pk)}, format='json')
+        return (response, len(queries))
+
+    def test_checkout_statements_do_not_grow_with_the_cart(self):
+        #The first checkout also creates the customer.
+        self.checkout(movies=1)
+        (small, small_queries) = self.checkout(movies=1)
+        (large, large_queries) = self.checkout(movies=6)
+        self.assertEqual((small.status_code, large.status_code), (201, 201))
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(list(Movie.objects.order_by('pk').values_list('inventory', flat=True)), [0, 2, 2, 2, 2, 2])
+
+    def test_out_of_stock_checkout_takes_nothing(self):
+        (response, queries) = self.checkout(movies=3, quantity=4)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('00000', str(response.data['cart_id']))
+        self.assertEqual(set(Movie.objects.values_list('inventory', flat=True)), {3})
+
+    def test_returning_an_order_again_does_not_restock_it_again(self):
+        (response, queries) = self.checkout(movies=2)
+        order = RentOrder.objects.get(pk=response.data['id'])
+        #Returned, moved back to Collected in the admin, and returned again.
+        for order_status in [RentOrder.ORDER_STATUS_RETURNED, RentOrder.ORDER_STATUS_COLLECTED, RentOrder.ORDER_STATUS_RETURNED]:
+            order.order_status = order_status
+            order.save()
+        for event_id in OutboxEvent.objects.order_by('pk').values_list('pk', flat=True):
+            self.assertTrue(handle_event(event_id))
+        self.assertEqual(set(Movie.objects.values_list('inventory', flat=True)), {3})
+
+
+class CartStoreTests(TestCase):
+    def test_malformed_cart_ids_are_not_found(self):
+        client = APIClient()
+        for store in ['hub.carts.DatabaseCartStore', 'hub.carts.CacheCartStore']:
+            with override_settings(CART_STORE=store, CART_CACHE_SINGLE_PROCESS=True):
+                for url in ['/hub/carts/not-a-uuid/', '/hub/carts/not-a-uuid/items/1/']:
+                    self.assertEqual(client.get(url).status_code, 404)
+                    self.assertEqual(client.delete(url).status_code, 404)
+                self.assertEqual(client.get('/hub/carts/not-a-uuid/items/').status_code, 404)
+
+    def test_cache_store_refuses_a_local_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CacheCartStore()
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_updates_apply_on_commit_on_top_of_each_other(self):
+        create_movies(2)
+        board = LeaderboardCounter.BOARD_MOVIES
+        day = timezone.localdate()
+        self.assertEqual(get_leaderboard(board, 'week'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            increment(board, {'00000': 1}, day)
+            #Not in the cached list until the counters are committed.
+            self.assertEqual(get_leaderboard(board, 'week'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            increment(board, {'00001': 3}, day)
+        with self.captureOnCommitCallbacks(execute=True):
+            increment(board, {'00000': 1}, day)
+        self.assertEqual([(entry['id'], entry['count']) for entry in get_leaderboard(board, 'week')],
+                         [('00001', 3), ('00000', 2)])
+
+
+class ExportTests(TestCase):
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_exports_read_every_row_of_both_tables_once(self):
+        movies = create_movies(5)
+        customer = Customer.objects.create(user=get_user_model().objects.create_user('customer', 'customer@example.com', 'secret'))
+        orders = RentOrder.objects.bulk_create([
+            RentOrder(customer=customer, order_status=RentOrder.ORDER_STATUS_RETURNED,
+                      payment_status=RentOrder.PAYMENT_STATUS_COMPLETE if i % 2 else RentOrder.PAYMENT_STATUS_PENDING)
+            for i in range(5)])
+        items = RentOrderItem.objects.bulk_create([
+            RentOrderItem(rent_order=order, movie=movie, quantity=1, unit_price=movie.daily_rental_rate)
+            for order in orders for movie in movies[:3]])
+        #rent_date is set on creation, so the orders are made old afterwards.
+        RentOrder.objects.update(rent_date=timezone.now() - timedelta(days=400))
+        self.assertEqual(archive_batch(), 2)
+
+        (headers, rows) = order_rows()
+        item_ids = [row[headers.index('item_id')] for row in rows]
+        self.assertEqual(sorted(item_ids), sorted(item.pk for item in items))
+        self.assertEqual(len(item_ids), len(set(item_ids)))
+        (headers, rows) = movie_rows()
+        self.assertEqual([row[0] for row in rows], [movie.pk for movie in movies])
+
+
+class LateFeeTests(TestCase):
+    def test_every_outstanding_item_is_charged_once_across_chunks(self):
+        movies = create_movies(2)
+        customer = Customer.objects.create(user=get_user_model().objects.create_user('customer', 'customer@example.com', 'secret'))
+        orders = RentOrder.objects.bulk_create([
+            RentOrder(customer=customer, order_status=RentOrder.ORDER_STATUS_RETURNED if i == 0 else RentOrder.ORDER_STATUS_COLLECTED)
+            for i in range(4)])
+        RentOrderItem.objects.bulk_create([
+            RentOrderItem(rent_order=order, movie=movie, quantity=1, unit_price=movie.daily_rental_rate)
+            for order in orders for movie in movies])
+        RentOrder.objects.update(rent_date=timezone.now() - timedelta(days=10, hours=1))
+
+        #Seven days past the three day rental, at half of the 2.00 unit price a day.
+        self.assertEqual(update_late_fees(chunk_size=4), (6, 6))
+        self.assertEqual(update_late_fees(chunk_size=4), (6, 0))
+        self.assertEqual(sorted(set(RentOrderItem.objects.values_list('rent_order__order_status', 'late_fee'))),
+                         [(RentOrder.ORDER_STATUS_COLLECTED, Decimal('7.00')), (RentOrder.ORDER_STATUS_RETURNED, Decimal('0.00'))])
+
+
+class OrderArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.staff = APIClient()
+        self.staff.force_authenticate(User.objects.create_superuser('staff', 'staff@example.com', 'secret'))
+        self.customer = Customer.objects.create(user=User.objects.create_user('customer', 'customer@example.com', 'secret'))
+        self.movies = create_movies(2)
+        orders = RentOrder.objects.bulk_create([RentOrder(customer=self.customer) for i in range(25)])
+        RentOrderItem.objects.bulk_create([
+            RentOrderItem(rent_order=order, movie=self.movies[0], quantity=1, unit_price=Decimal('2.00')) for order in orders])
+        self.order_ids = [order.pk for order in orders]
+        self.assertEqual(archive_oldest_orders(12), 12)
+
+    def test_listings_read_both_tables_newest_first(self):
+        newest_first = self.order_ids[::-1]
+        self.assertEqual(walk(self.staff, '/hub/rentorders/'), newest_first)
+        self.assertEqual(walk(self.staff, f'/hub/customers/{self.customer.pk}/history/'), newest_first)
+        response = self.staff.get(f'/hub/rentorders/{self.order_ids[0]}/')
+        self.assertEqual((response.status_code, len(response.data['items'])), (200, 1))
+        self.assertEqual(self.staff.get('/hub/rentorders/not-an-id/').status_code, 404)
+
+    def test_movies_with_archived_orders_are_not_deleted(self):
+        self.assertEqual(self.staff.delete(f'/hub/movies/{self.movies[0].pk}/').status_code, 405)
+        self.assertEqual(self.staff.delete(f'/hub/movies/{self.movies[1].pk}/').status_code, 204)
+
+
+class GenreTests(TestCase):
+    def test_genres_with_movies_are_not_deleted(self):
+        cache.clear()
+        staff = APIClient()
+        staff.force_authenticate(get_user_model().objects.create_user('staff', 'staff@example.com', 'secret', is_staff=True))
+        (used, unused) = Genre.objects.bulk_create([Genre(title='Used'), Genre(title='Unused')])
+        movie = Movie.objects.create(id='00000', title='Movie', description='', daily_rental_rate=Decimal('2.00'), inventory=1)
+        movie.genres.add(used)
+
+        self.assertEqual(staff.delete(f'/hub/genres/{used.pk}/').status_code, 405)
+        self.assertEqual(list(movie.genres.all()), [used])
+        self.assertEqual(staff.delete(f'/hub/genres/{unused.pk}/').status_code, 204)
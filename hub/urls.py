@@ -1,6 +1,6 @@
 from django.urls import include, path
 from rest_framework_nested import routers
-from .views import CartViewSet, CartItemViewSet, CustomerViewSet, MovieViewSet, GenreViewSet, RentOrderViewSet, ReviewViewset
+from .views import CartViewSet, CartItemViewSet, CustomerViewSet, ExportViewSet, MovieViewSet, GenreViewSet, LeaderboardViewSet, RentalQuoteViewSet, RentOrderViewSet, RevenueViewSet, ReviewViewset
 
 #Creating and registering the parent router in router and in router.urls we
 # would have access to movie-list and movie-detail lookup fields. 
@@ -10,6 +10,10 @@ router.register('genres', GenreViewSet)
 router.register('carts', CartViewSet, basename='carts')
 router.register('customers', CustomerViewSet)
 router.register('rentorders', RentOrderViewSet, basename='rentorders')
+router.register('quotes', RentalQuoteViewSet, basename='quotes')
+router.register('revenue', RevenueViewSet, basename='revenue')
+router.register('leaderboards', LeaderboardViewSet, basename='leaderboards')
+router.register('exports', ExportViewSet, basename='exports')
 
 #Creating a parent router, movies, for the child router using the parent router, the parent prefix for the
 # child resource and the lookup parameter for the child resource 
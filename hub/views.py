@@ -1,37 +1,67 @@
 from django.shortcuts import get_object_or_404
-from django.db.models.aggregates import Count
+from django.db.models import Prefetch
+from django.core.exceptions import ValidationError
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework import status
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser      
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated, IsAdminUser      
 from rest_framework.response import Response
 from rest_framework import mixins
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
-from .filters import GenreFilters, MovieFilters, CartItemFilters
-from .models import Cart, CartItem, Customer,Genre, Movie, RentOrder, Review
-from .serializers import AddCartItemSerializer, CartSerializer, CartItemSerializer, CreateRentOrderSerializer, CustomerSerializer, GenreSerializer, MovieSerializer, RentOrderSerializer, ReviewSerializer, UpdateCartItemSerializer
-from .permissions import IsAdminOrReadOnly, BlockUserPermission, ViewCustomerHistoryPermission
+from .filters import GenreFilters, MovieFilters
+from .archive import OrderHistory
+from .blocklist import block_users, unblock_users
+from .caching import CatalogCacheMixin
+from .carts import get_cart_store
+from .customers import get_customer_id
+from .exports import CONTENT_TYPES, export_lines, movie_rows, order_rows
+from .facets import get_movie_facets
+from .history import get_history, get_summary
+from .latefees import preview_order_fees
+from .leaderboards import get_leaderboard
+from .revenue import get_revenue
+from .fieldsets import SparseFieldsMixin
+from .search import MovieSearchFilter
+from .pagination import MovieCursorPagination, RentOrderCursorPagination
+from .models import Customer, Genre, LeaderboardCounter, Movie, RentOrder, RentOrderItem, Review
+from .serializers import GENRE_MOVIE_PREVIEW_SIZE, AddCartItemSerializer, AddCartItemsSerializer, CartSerializer, CartItemSerializer, CreateRentOrderSerializer, CustomerSerializer, CustomerSummarySerializer, ExportQuerySerializer, GenreSerializer, HistoryQuerySerializer, LeaderboardQuerySerializer, MovieSerializer, OrderExportQuerySerializer, RentalQuoteSerializer, RentOrderSerializer, RevenueQuerySerializer, ReviewSerializer, UpdateCartItemSerializer
+from .permissions import IsAdminOrReadOnly, BlockUserPermission, CanBlockUserPermission, ViewCustomerHistoryPermission
 
 
 
-#Note to self, create a late fee charge custom view in the Order view 
-#  to calculate the fees to be paid when a movie is returned late.
-
 # Create your views here.
 
 #Class to create a rest_framework view which handles requests 
 # and gives objects as its response, depending on the methods specified.
 
-class MovieViewSet(ModelViewSet):
+#CatalogCacheMixin answers repeat reads from the response cache and conditional GETs with a 304.
+class MovieViewSet(CatalogCacheMixin, SparseFieldsMixin, ModelViewSet):
     queryset = Movie.objects.prefetch_related('genres').all()
     serializer_class = MovieSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    #MovieSearchFilter reads ?search= from the inverted index in search.py instead of running
+    # icontains lookups on title and genres__title.
+    filter_backends = [DjangoFilterBackend, MovieSearchFilter, OrderingFilter]
     filterset_class = MovieFilters
     permission_classes = [IsAdminOrReadOnly, BlockUserPermission]
-    search_fields = ['title', 'genres__title']
-    ordering_fields = ['daily_rental_rate', 'last_update']
+    ordering_fields = ['title', 'daily_rental_rate', 'last_updated']
+    #Keyset pagination so deep pages don't pay for a COUNT(*) and a large OFFSET.
+    pagination_class = MovieCursorPagination
+    #Filtering on the stock skips the response cache, see caching.py.
+    stock_params = ['inventory__gt', 'inventory__lt']
+
+    #Columns and relations needed by each field for ?fields= and ?exclude=. The ordering fields
+    # are always loaded so the cursor pagination can read its position from the page.
+    sparse_required_columns = ['id', 'title', 'daily_rental_rate', 'last_updated']
+    sparse_columns = {
+        'inventory': ['inventory'],
+        'age_rating': ['age_rating'],
+    }
+    sparse_prefetches = {
+        'genres': ['genres'],
+    }
 
     
 
@@ -39,10 +69,33 @@ class MovieViewSet(ModelViewSet):
     def get_serializer_context(self):
         return {'request': self.request}
 
-    #Overriding the Destroy mixin in the ApiView since there is additional logic here.
-    def delete(self, request, pk):
+    #The stock in cached responses is refreshed by movie id (see caching.py), so a fieldset that
+    # shows the inventory always shows the id with it.
+    def get_sparse_fields(self, available_fields):
+        keep = super().get_sparse_fields(available_fields)
+        if keep is not None and 'inventory' in keep:
+            return [name for name in available_fields if name in keep or name == 'id']
+        return keep
+
+    def stock_rows(self, data):
+        rows = data.get('results', [data]) if isinstance(data, dict) else []
+        return [row for row in rows if 'id' in row and 'inventory' in row]
+
+    #Genre, age rating and price bucket counts for the movies matching the same filters and
+    # search as the list, e.g. hub/movies/facets/?search=naruto&daily_rental_rate__lt=5
+    @action(detail=False)
+    def facets(self, request):
+        return self.cached_response(self.get_facets, request)
+
+    def get_facets(self, request):
+        return Response(get_movie_facets(self.filter_queryset(self.get_queryset())))
+
+    #Overriding the Destroy mixin in the ApiView since there is additional logic here. The router
+    # sends DELETE to destroy, a method named delete would never be called.
+    def destroy(self, request, pk):
         movie = get_object_or_404(Movie, pk=pk)
-        if movie.rentorderitems.count() > 0:
+        #Archived orders still reference their movies.
+        if movie.rentorderitems.exists() or movie.archivedrentorderitems.exists():
             return Response({'error': 'Movie cannot be deleted because it is associated with a rent orderitem'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
         movie.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -51,8 +104,14 @@ class MovieViewSet(ModelViewSet):
 
 
 
-class GenreViewSet(ModelViewSet):
-    queryset = Genre.objects.annotate(movie_count=Count('movie')).all().prefetch_related('movie')
+#Prefetching only the first few movies of each genre (a sliced prefetch, one query for all genres).
+def genre_movie_preview():
+    return Prefetch('movie', queryset=Movie.objects.only('id', 'title')[:GENRE_MOVIE_PREVIEW_SIZE], to_attr='movie_preview')
+
+
+class GenreViewSet(CatalogCacheMixin, SparseFieldsMixin, ModelViewSet):
+    #movie_count is a column on Genre, so listing genres costs the same whatever the size of the catalog.
+    queryset = Genre.objects.prefetch_related(genre_movie_preview()).all()
 
     serializer_class = GenreSerializer
   
@@ -60,12 +119,20 @@ class GenreViewSet(ModelViewSet):
     #Specifying the class to be used to filter
     filterset_class = GenreFilters
     permission_classes = [IsAdminOrReadOnly, BlockUserPermission]
-    
 
-    def delete(self, request, pk):
+    sparse_required_columns = ['id', 'title']
+    sparse_columns = {
+        'movie_count': ['movie_count'],
+    }
+    sparse_prefetches = {
+        'movie': [genre_movie_preview()],
+    }
+
+    #The router sends DELETE to destroy, a method named delete would never be called.
+    def destroy(self, request, pk):
         #Getting a single genre using the pk
         genre = get_object_or_404(Genre, pk=pk)
-        if genre.movie.count() > 0:
+        if genre.movie_count > 0:
             return Response({'error': 'Genre Cannot be deleted as it still is referencing a movie'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
         genre.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -75,31 +142,35 @@ class GenreViewSet(ModelViewSet):
 
 
 
-class CartViewSet(mixins.CreateModelMixin, 
-                  mixins.RetrieveModelMixin, 
-                  mixins.UpdateModelMixin, 
-                  mixins.DestroyModelMixin, 
-                  GenericViewSet):
-    #Performing an eager load where we get all items related with cart and also the related movies of each item.
-    queryset = Cart.objects.prefetch_related('items__movie').all()
+#The cart endpoints go through the cart store configured with CART_STORE (see carts.py) instead
+# of querying Cart and CartItem directly, so live carts can be kept out of the database.
+class CartViewSet(GenericViewSet):
     serializer_class = CartSerializer
-        
 
+    def create(self, request):
+        cart = get_cart_store().create_cart()
+        return Response(CartSerializer(cart).data, status=status.HTTP_201_CREATED)
 
+    def retrieve(self, request, pk):
+        return Response(CartSerializer(get_cart_store().get_cart(pk)).data)
 
-class CartItemViewSet(ModelViewSet):
-    #List of http method names that we allow
-    http_method_names = ['get', 'post', 'patch', 'delete']
+    #A cart has no writable fields, updating it returns it as it is.
+    def update(self, request, pk):
+        return self.retrieve(request, pk)
 
+    def partial_update(self, request, pk):
+        return self.retrieve(request, pk)
 
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = CartItemFilters
+    def destroy(self, request, pk):
+        get_cart_store().delete_cart(pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+
+class CartItemViewSet(GenericViewSet):
+    #List of http method names that we allow
+    http_method_names = ['get', 'post', 'patch', 'delete']
 
-    #Since we don't want to return all cart items and only want to return items based
-    #on the cart id given, we would have to override the queryset.
-    def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('movie')
-    
     #function to return a serializer class depending on the operation the user seeks to carry out
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -111,9 +182,56 @@ class CartItemViewSet(ModelViewSet):
     #function to extract the cart id from the urls defined in urls.py
     def get_serializer_context(self):
         return {'cart_id': self.kwargs.get('cart_pk')}
+
+    def get_object(self):
+        return get_cart_store().get_item(self.kwargs['cart_pk'], self.kwargs['pk'])
+
+    def list(self, request, cart_pk):
+        items = get_cart_store().list_items(cart_pk)
+        page = self.paginate_queryset(items)
+        serializer = CartItemSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def create(self, request, cart_pk):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['POST'])
+    def batch(self, request, cart_pk):
+        serializer = AddCartItemsSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        items = serializer.save()
+        return Response(AddCartItemSerializer(items, many=True).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, cart_pk, pk):
+        return Response(CartItemSerializer(self.get_object()).data)
+
+    def partial_update(self, request, cart_pk, pk):
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    def destroy(self, request, cart_pk, pk):
+        get_cart_store().remove_item(cart_pk, pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
             
 
 
+#Endpoint to price renting a list of movies for a number of days without creating an order.
+#POST hub/quotes/ with {"days": 3, "items": [{"movie_id": "1", "quantity": 2}]}
+class RentalQuoteViewSet(GenericViewSet):
+    serializer_class = RentalQuoteSerializer
+    permission_classes = [AllowAny]
+
+    def create(self, request):
+        serializer = RentalQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.quote())
+
+
 class ReviewViewset(ModelViewSet):
     serializer_class = ReviewSerializer
 
@@ -142,13 +260,31 @@ class CustomerViewSet(ModelViewSet):
     # it to be included in the customer list view else it would be available on the
     # customer detail view.
 
+    #A customer's orders, newest first, a page at a time through the (customer, rent_date) index
+    # and with the customer's running totals. Orders moved to the archive are included.
+    # hub/customers/1/history/?start=2023-01-01&end=2023-12-31
     @action(detail=True, permission_classes=[ViewCustomerHistoryPermission])
     def history(self, request, pk):
-        pass
-
-    @action(detail=True, permission_classes=[BlockUserPermission])
+        customer = get_object_or_404(Customer.objects.select_related('summary').only('id', 'summary'), pk=pk)
+        query = HistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        orders = get_history(customer.pk, **query.validated_data).prefetch_related(rent_order_items_prefetch)
+
+        paginator = RentOrderCursorPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        response = paginator.get_paginated_response(RentOrderSerializer(page, many=True).data)
+        response.data['summary'] = CustomerSummarySerializer(get_summary(customer)).data
+        return response
+
+    #Blocking (POST) or unblocking (DELETE) the customer's user. hub/customers/1/block/
+    @action(detail=True, methods=['POST', 'DELETE'], permission_classes=[CanBlockUserPermission])
     def block(self, request, pk):
-        pass
+        customer = get_object_or_404(Customer.objects.only('id', 'user_id'), pk=pk)
+        if request.method == 'POST':
+            block_users([customer.user_id])
+        else:
+            unblock_users([customer.user_id])
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 
@@ -175,30 +311,68 @@ class CustomerViewSet(ModelViewSet):
     #  IsAuthenticated permission to update data and an IsAdmin to be able to delete data,
     #  that would require overriding the get_permissions function.
 
+    #The history and block actions keep the permission classes given to them.
     def get_permissions(self):
+        if self.action in ['history', 'block']:
+            return super().get_permissions()
         if self.request.method == 'GET':
             return [AllowAny()]
         return [IsAuthenticated()]
 
 
-class RentOrderViewSet(ModelViewSet):
+#Order items with their movie trimmed to the columns SimpleMovieSerializer shows.
+def rent_order_items_prefetch(item_model=RentOrderItem):
+    return Prefetch('items', queryset=item_model.objects.select_related('movie').only(
+        'id', 'rent_order_id', 'quantity', 'unit_price', 'late_fee', 'movie__id', 'movie__title', 'movie__daily_rental_rate'))
+
+
+class RentOrderViewSet(SparseFieldsMixin, ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = RentOrderCursorPagination
+
+    sparse_required_columns = ['id', 'rent_date']
+    sparse_columns = {
+        'customer': ['customer'],
+        'order_status': ['order_status'],
+        'return_date': ['return_date'],
+        'payment_status': ['payment_status'],
+    }
+    #A function of the item model, the orders are read from both the hot and the archive tables.
+    sparse_prefetches = {
+        'items': [rent_order_items_prefetch],
+    }
 
     #overriding the queryset to return all orders if the user is a staff 
     #else return only the orders of the current user if the person isn't.
-
-
+    #Reads go through OrderHistory, so orders moved to the archive are still listed and shown. A
+    # page of orders costs a query for the orders and one for their items with their movies in
+    # each table. Changes only apply to the orders that aren't archived.
     def get_queryset(self):
         user = self.request.user
+        if self.request.method in SAFE_METHODS:
+            queryset = OrderHistory().prefetch_related(rent_order_items_prefetch)
+        else:
+            queryset = RentOrder.objects.prefetch_related(rent_order_items_prefetch())
         #If the user is a staff.
         if user.is_staff:
-           RentOrder.objects.all()
+            return queryset.all()
         #The only way to get the current user's id is not from the url 
         #as has been done all this while but from self.request.user
-        (customer_id, created) = Customer.objects.only('id').get_or_create(user_id=user.id)
-        #Then we return the curent user's order.
-        return RentOrder.objects.filter(customer_id=customer_id)
-    
+        #Then we return the curent user's order, through the (customer, rent_date) index.
+        return queryset.filter(customer_id=get_customer_id(user.id))
+
+    def get_object(self):
+        if self.request.method not in SAFE_METHODS:
+            return super().get_object()
+        try:
+            order = self.filter_queryset(self.get_queryset()).filter(pk=self.kwargs['pk']).first()
+        except (TypeError, ValueError, ValidationError):
+            order = None
+        if order is None:
+            raise Http404
+        self.check_object_permissions(self.request, order)
+        return order
+
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -207,4 +381,78 @@ class RentOrderViewSet(ModelViewSet):
     
 
     def get_serializer_context(self):
-        return {'user_id': self.request.user.id}
\ No newline at end of file
+        return {
+            'user_id': self.request.user.id,
+            'idempotency_key': self.request.headers.get('Idempotency-Key'),
+        }
+
+    #Late fees the order would owe if its movies were returned now.
+    @action(detail=True, url_path='late-fees')
+    def late_fees(self, request, pk):
+        return Response(preview_order_fees(self.get_object()))
+
+    #Checking out a cart. Responds with the order, 201 when it was created and 200 when the
+    # Idempotency-Key header matched an order created by an earlier attempt.
+    def create(self, request):
+        serializer = CreateRentOrderSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+        order = RentOrder.objects.prefetch_related(rent_order_items_prefetch()).get(pk=order.pk)
+        return Response(RentOrderSerializer(order).data,
+                        status=status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK)
+
+
+#Revenue for staff, read from the daily rollups so it costs the same whatever the size of the
+# order history. hub/revenue/?period=month&start=2023-01-01&end=2023-12-31
+class RevenueViewSet(GenericViewSet):
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        serializer = RevenueQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(get_revenue(**serializer.validated_data))
+
+
+#Top 10 movies and customers for the week, the month or all time, served from the cached top
+# lists kept by leaderboards.py. hub/leaderboards/movies/?window=week
+class LeaderboardViewSet(GenericViewSet):
+    def get_window(self, request):
+        serializer = LeaderboardQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['window']
+
+    @action(detail=False, permission_classes=[AllowAny])
+    def movies(self, request):
+        return Response(get_leaderboard(LeaderboardCounter.BOARD_MOVIES, self.get_window(request)))
+
+    @action(detail=False, permission_classes=[IsAdminUser])
+    def customers(self, request):
+        return Response(get_leaderboard(LeaderboardCounter.BOARD_CUSTOMERS, self.get_window(request)))
+
+
+
+#Streamed dumps of the orders and the catalog for finance and partners, instead of paging through
+# the API. hub/exports/orders/?output=ndjson&start=2023-01-01&payment_status=C
+class ExportViewSet(GenericViewSet):
+    permission_classes = [IsAdminUser]
+
+    def stream(self, name, output, headers, rows):
+        response = StreamingHttpResponse(export_lines(output, headers, rows), content_type=CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="{name}.{output}"'
+        return response
+
+    @action(detail=False)
+    def orders(self, request):
+        query = OrderExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        filters = dict(query.validated_data)
+        output = filters.pop('output')
+        return self.stream('orders', output, *order_rows(**filters))
+
+    @action(detail=False)
+    def movies(self, request):
+        query = ExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        filters = dict(query.validated_data)
+        output = filters.pop('output')
+        return self.stream('movies', output, *movie_rows(**filters))
@@ -158,6 +158,83 @@ REST_FRAMEWORK = {
 
 
 
+#The catalog response cache (hub/caching.py) uses the default cache. With several worker processes
+# this should point at a shared backend such as Redis or Memcached so that invalidation reaches all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    #Live carts when CART_STORE is the CacheCartStore (hub/carts.py). Entries are only written back
+    # to the database by the flush_carts command, so this has to be a Redis cache with
+    # maxmemory-policy noeviction, e.g.
+    #   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'
+    'carts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'carts',
+        #The default of 300 entries would cull live carts.
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+#How long, in seconds, a cached catalog response is kept. Changes to movies and genres invalidate
+# it straight away, this only bounds how long unused entries stay around.
+CATALOG_CACHE_TIMEOUT = 60 * 60
+#How long, in seconds, the stock of a movie shown in catalog responses is cached. Checkouts clear
+# it for their movies, this bounds how stale a value read while a checkout commits can be.
+CATALOG_STOCK_TIMEOUT = 60
+
+#Number of threads rendering barcode images in the background (hub/barcodes.py).
+BARCODE_WORKERS = 2
+
+#Where carts are kept: 'hub.carts.CacheCartStore' or 'hub.carts.DatabaseCartStore'.
+CART_STORE = 'hub.carts.DatabaseCartStore'
+CART_CACHE = 'carts'
+#Lets the CacheCartStore run on the local memory 'carts' cache, which is only safe when a single
+# process serves every cart (tests, runserver).
+CART_CACHE_SINGLE_PROCESS = False
+#Seconds after which an untouched cart is written back to the database and dropped from the cache.
+CART_IDLE_TIMEOUT = 30 * 60
+#Age in days after which purge_carts deletes a cart, and how fast it is allowed to delete them.
+CART_RETENTION_DAYS = 90
+CART_PURGE_ROWS_PER_SECOND = 5000
+
+#Late fee policy used by hub/latefees.py. DAILY_PERCENT is the share of the unit price charged per
+# late day and copy, DAILY_CAP the most that is charged per day and copy.
+LATE_FEES = {
+    'RENTAL_DAYS': 3,
+    'GRACE_DAYS': 1,
+    'DAILY_PERCENT': 50,
+    'DAILY_CAP': '5.00',
+}
+
+#Number of entries kept in each leaderboard (hub/leaderboards.py).
+LEADERBOARD_SIZE = 10
+
+#Rows read from the database at a time by the streaming exports (hub/exports.py).
+EXPORT_CHUNK_SIZE = 2000
+
+#Returned and paid orders rented more than ARCHIVE_AFTER_DAYS ago are moved to the archive tables
+# by the archive_orders command, ARCHIVE_BATCH_SIZE orders per transaction (hub/archive.py).
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 1000
+
+#Order events outbox (hub/outbox.py). A claimed event is retried OUTBOX_LEASE_SECONDS after its
+# worker stopped without finishing it, and given up on after OUTBOX_MAX_ATTEMPTS failures.
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_WORKERS = 4
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_RETENTION_DAYS = 7
+
+#Blocked users (hub/blocklist.py). Each process checks for changes to the blocklist at most every
+# BLOCKLIST_CHECK_SECONDS, and rereads it after BLOCKLIST_MAX_AGE seconds regardless.
+BLOCKLIST_CHECK_SECONDS = 1
+BLOCKLIST_MAX_AGE = 5 * 60
+
+#Tax added to rental prices by hub/pricing.py, as a fraction of the price.
+RENTAL_TAX_RATE = '0.10'
+
+
 #settings to change the model django goes to for authentication
 AUTH_USER_MODEL = 'core.User'
 
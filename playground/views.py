@@ -1,4 +1,3 @@
-from django.forms import DecimalField
 from django.shortcuts import render
 from django.http import HttpResponse
 from rest_framework.generics import ListCreateAPIView
@@ -11,8 +10,7 @@ from hub.models import Customer, Genre, Movie, RentOrder
 # to the server. A response is shaped depending on how the view is defined.
 
 
-#Note to self to add a feature where carts that have been abandoned for more than 3 months should
-# be deleted by using the created_at field in the cart model. 
+#Carts abandoned for more than 3 months are deleted by the purge_carts command in the hub app.
 
 def say_hello(request):
     return render(request, 'hello.html', {'name': 'Uzo'})
@@ -38,59 +36,20 @@ def orders_and_items(request):
     queryset = RentOrder.objects.prefetch_related('rentorderitems_set__movie')
 
 
-# This should be in the view where there is an option for us to fill in 
-# daily_rental_rate and n days.
+# Charging a customer for n days is now done by the quote endpoint, hub/quotes/,
+# built on hub/pricing.py.
 
-def customercharge(daily_rental_rate, n_days):
-    charge = [daily_rental_rate * days for days in n_days]
-    return charge
+#The top movies and customers are served by hub/leaderboards/, from incrementally kept counters
 
-#function to get the top movies
 
-from django.db.models import Count
-def top_movies(request):
-    top_movies = Movie.objects.annotate(num_orders=Count('rentorderitems')).order_by('-num_orders')[:10]
+#Revenue for days, months and years is served by hub/revenue/, from the daily rollups
+# kept by hub/revenue.py.
 
-#function to get the top customers
-def top_customers(request):
-    top_users = Customer.objects.values('id').annotate(count=Count('id')).order_by('count')[:10]
-    return top_users
-
-
-#function to track the revenues for day, month and year
-#We would need to use the filter method which is applicable to days, month 
-# and year. We would also need to use the sum from the aggregate function 
-# to calculate the revenue for either of these options.
-
-from django.db.models import Sum, F, ExpressionWrapper
-from django.db.models.functions import ExtractMonth, ExtractDay, ExtractYear
-def get_revenue_data(day, month, year):
-
-    if RentOrder.PAYMENT_STATUS_CHOICES == 'C':
-        #Using an expression wrapper to specifyu an output field because quantity is an integer field 
-        # and unit_price is a decimal field so without an expression wrapper,
-        # the code would throw an exception. 
-
-        total = ExpressionWrapper(Sum(F('rentorderitem_set__quantity') * F('rentorderitem_set__unit_price')), output_field=DecimalField())
-
-        monthly_revenue = RentOrder.objects.annotate(month=ExtractMonth('placed_at'))\
-        .values('month').annotate(total_quantity_count=Sum('rentorderitem_set__quantity'), total=total)
-        
-        daily_revenue = RentOrder.objects.annotate(day=ExtractDay('placed_at'))\
-        .values('month').annotate(total_quantity_count=Sum('rentorderitem_set__quantity'), total=total)
-        yearly_revenue = RentOrder.objects.annotate(day=ExtractYear('placed_at'))\
-        .values('month').annotate(total_quantity_count=Sum('rentorderitem_set__quantity'), total=total)
-        
 
 #Value objects would be important whenever we would want to pass an 
 # expression like a number or a string.
 
 
-#Function to calculate the top customers who have made orders
-
-def get_top_customers(request):
-    queryset = Customer.objects.annotate(orders_count=Count('rentorder'))
-
 
     #The ability to override the save method is something that may come in handy in the future when we want to override how objects are
     #saved by unpacking the validated data that we pass in through JSON and use that data by either associating it with another class by 